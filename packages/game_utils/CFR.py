@@ -26,6 +26,8 @@ class CFRSolver:
     def __init__(self, game_class: ZeroSumGame):
         self.game_class = game_class
         self.node_map = {}  # maps info sets to nodes
+        self.iterations = 0  # total iterations trained, over all calls to train
+        self.exploitabilities = []  # (iteration, exploitability) pairs, recorded during training
 
     class Node: # one per info set
         def __init__(self, num_actions):
@@ -96,8 +98,12 @@ class CFRSolver:
 
         return strategy_value
 
-    def train(self, iterations, verbose=True):
-        """ Run CFR for the specified number of iterations. initialize_game_func should return a new game state. """
+    def train(self, iterations, verbose=True, exploitability_every=None):
+        """ 
+        Run CFR for the specified number of iterations. initialize_game_func should return a new game state. 
+        If exploitability_every is set, the exploitability of the average strategies is computed every
+        exploitability_every iterations and recorded in self.exploitabilities.
+        """
         start_time = time.time()
 
         for i in range(iterations):
@@ -107,6 +113,13 @@ class CFRSolver:
                 state = self.game_class.random()
                 reach_probs = np.ones(2)
                 self._cfr_update(player, state, reach_probs)
+            self.iterations += 1
+
+            if exploitability_every is not None and (i + 1) % exploitability_every == 0:
+                exploitability = self.game_class.exploitability(self.get_strategy(0), self.get_strategy(1))
+                self.exploitabilities.append((self.iterations, exploitability))
+                if verbose:
+                    print(f"  Iteration {i + 1:6d}/{iterations}: exploitability: {exploitability:.6f}")
 
             if verbose and (i + 1) % max(1, iterations // 10) == 0:
                 iter_time = time.time() - iter_start
@@ -129,8 +142,12 @@ class CFRSolver:
             print(f"  Average rate: {final_rate:.1f} iterations/s")
 
     def get_strategy(self, player):
-        """ Return the learned strategy for the given player as a MixedStrategy object."""
+        """ Return the learned strategy for the given player as a MixedStrategy object. 
+        Info sets that training has not visited yet play uniformly at random."""
         # node_map maps info sets to frequency arrays.
         infoSets = self.game_class.all_info_sets(player)
-        return MixedStrategy({I: self.node_map[I].get_average_strategy() for I in infoSets}, self.game_class)
+        return MixedStrategy({
+            I: self.node_map[I].get_average_strategy() if I in self.node_map else normalize(np.ones(len(self.game_class.get_actions_at_info_set(I))))
+            for I in infoSets
+        }, self.game_class)
     
\ No newline at end of file
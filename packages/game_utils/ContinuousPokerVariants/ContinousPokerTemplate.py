@@ -1,6 +1,9 @@
 import numpy as np
+from functools import lru_cache
 import matplotlib.pyplot as plt
 from matplotlib.colors import TwoSlopeNorm
+from scipy.stats import qmc
+from game_utils.utils import integrate
 
 # TEMPLATE CLASS
 class ContinuousPokerTemplate:
@@ -40,6 +43,24 @@ class ContinuousPokerTemplate:
     def win_ante_payoff(_, area):
         return area*0.5
 
+    # expected payoffs of the bettor holding x, against a caller whose hand is uniform on [0, 1].
+    # these are the building blocks of the exact expected payoffs of the variants.
+
+    @staticmethod
+    def bluff_payoff_x(s, c):
+        # bluff s, and the caller calls (bettor loses s + 1/2) above the call threshold c
+        return c - 0.5 - s * (1 - c)
+
+    @staticmethod
+    def check_payoff_integral(lo, hi):
+        # integral of the check payoff x - 1/2 over lo < x < hi
+        return (hi**2 - lo**2) / 2 - (hi - lo) / 2
+
+    @staticmethod
+    def value_payoff_x(x, s, c):
+        # value bet s, the caller folds below c, and calls and loses (c < y < x) or wins (y > x) above it
+        return c / 2 + (2 * x - c - 1) * (s + 0.5)
+
     @staticmethod  
     def outcome_to_payoff(outcome, s):
         if outcome == "Bluff_Called":
@@ -59,6 +80,179 @@ class ContinuousPokerTemplate:
         else:
             raise ValueError(f"Unknown outcome: {outcome}")
 
+    # outcome codes used by the array methods: OUTCOMES[code] is the outcome, and ERROR_CODE marks points where evaluation failed
+    OUTCOMES = ("Bluff_Called", "Bluff_Fold", "Value_Fold", "Value_Loses", "Value_Wins", "Check_Wins", "Check_Loses")
+    ERROR_CODE = -1
+
+    @classmethod
+    def outcome_coefficients(cls):
+        '''
+        Every payoff is linear in the bet size s: outcome_to_payoff(outcome, s) = ante + showdown * s.
+        Return the arrays (ante, showdown), indexed by outcome code.
+        '''
+        ante = np.array([cls.outcome_to_payoff(outcome, 0) for outcome in cls.OUTCOMES])
+        showdown = np.array([cls.outcome_to_payoff(outcome, 1) for outcome in cls.OUTCOMES]) - ante
+        return ante, showdown
+
+    @staticmethod
+    def _apply_array(func, values, *args, **kwargs):
+        '''
+        Apply func to a 1D array of values. func is first called on the whole array; if it does not support arrays
+        (it branches on the value, or solves for a root), it is called once per value instead.
+        Returns the results as a float array, and a mask of the values where func raised (their result is nan).
+        '''
+        errors = np.zeros(values.shape, dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            try:
+                return np.broadcast_to(np.asarray(func(values, *args, **kwargs), dtype=np.float64), values.shape).copy(), errors
+            except Exception:
+                pass
+            results = np.empty(values.shape)
+            for i, value in enumerate(values):
+                try:
+                    results[i] = func(value, *args, **kwargs)
+                except Exception:
+                    results[i] = np.nan
+                    errors[i] = True
+        return results, errors
+
+    @classmethod
+    def payoff_outcome_array(cls, x, y, **kwargs):
+        '''
+        Array version of payoff_outcome. x and y are arrays which broadcast together (e.g. xs[:, None] and ys[None, :] for a grid).
+        The thresholds are computed once, and the sizing and call functions are applied to whole arrays of x (only where the
+        bettor bluffs or value bets), so their cost is per distinct x rather than per (x, y) point.
+        Returns:
+            payoff: the bettor's payoff at every point. It is nan where evaluation failed, and may be infinite.
+            codes: int8 outcome codes (see OUTCOMES), ERROR_CODE where a sizing or call function raised.
+        '''
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        # sizes only depend on x, so work on the distinct x values (before broadcasting against y)
+        x_values, x_inverse = np.unique(x, return_inverse=True)
+        x_inverse = x_inverse.reshape(x.shape)
+        shape = np.broadcast_shapes(x.shape, y.shape)
+        bluff = x_values < cls.bluff_threshold(**kwargs)
+        value = ~bluff & (x_values > cls.value_threshold(**kwargs))
+
+        sizes = np.zeros(x_values.shape)
+        errors = np.zeros(x_values.shape, dtype=bool)
+        sizes[bluff], errors[bluff] = cls._apply_array(cls.bluff_size, x_values[bluff], **kwargs)
+        sizes[value], errors[value] = cls._apply_array(cls.value_size, x_values[value], **kwargs)
+        call_thresholds = np.full(x_values.shape, np.nan)
+        bet = bluff | value
+        call_thresholds[bet], call_errors = cls._apply_array(cls.call_threshold, sizes[bet], **kwargs)
+        errors[bet] |= call_errors
+
+        # these keep the shape of x, and only broadcast against y in the comparisons below
+        s, c = sizes[x_inverse], call_thresholds[x_inverse]
+        bluff, value, errors = bluff[x_inverse], value[x_inverse], np.broadcast_to(errors[x_inverse], shape)
+        with np.errstate(invalid="ignore"):
+            codes = np.where(
+                bluff, np.where(y > c, 0, 1),
+                np.where(value, np.where(y < c, 2, np.where(y > x, 3, 4)),
+                np.where(x > y, 5, 6))
+            ).astype(np.int8)
+        codes = np.broadcast_to(codes, shape).copy()
+        codes[errors] = cls.ERROR_CODE
+
+        ante, showdown = cls.outcome_coefficients()
+        valid_codes = np.where(errors, 0, codes)
+        with np.errstate(invalid="ignore", over="ignore"):
+            # outcomes that do not depend on s keep a finite payoff even when s is not finite
+            payoff = np.where(showdown[valid_codes] == 0, ante[valid_codes], ante[valid_codes] + showdown[valid_codes] * s)
+        payoff = np.broadcast_to(payoff, shape).copy()
+        payoff[errors] = np.nan
+        return payoff, codes
+
+    @classmethod
+    def outcome_payoffs_x(cls, x, **kwargs):
+        '''
+        For each hand x of the bettor (an array), the contribution of each outcome to the bettor's expected payoff,
+        integrated exactly over the caller's hand y (uniform on [0, 1]). For a fixed x the payoff is piecewise constant in y,
+        jumping only at the call threshold and at y = x, so the inner integral is a sum of widths times payoffs.
+        Returns an array of shape (len(OUTCOMES), *x.shape), indexed by outcome code. Points where a sizing or call function raised are nan.
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        flat = x.ravel()
+        bluff = flat < cls.bluff_threshold(**kwargs)
+        value = ~bluff & (flat > cls.value_threshold(**kwargs))
+        check = ~bluff & ~value
+
+        sizes = np.zeros(flat.shape)
+        errors = np.zeros(flat.shape, dtype=bool)
+        sizes[bluff], errors[bluff] = cls._apply_array(cls.bluff_size, flat[bluff], **kwargs)
+        sizes[value], errors[value] = cls._apply_array(cls.value_size, flat[value], **kwargs)
+        c = np.zeros(flat.shape)
+        bet = bluff | value
+        c[bet], call_errors = cls._apply_array(cls.call_threshold, sizes[bet], **kwargs)
+        errors[bet] |= call_errors
+        c = np.clip(c, 0, 1)
+        # the caller calls a value bet above c, and wins above max(x, c)
+        x_call = np.maximum(flat, c)
+        showdown = sizes + 0.5
+
+        def width_times(width, payoff):
+            # a region of zero width contributes nothing, even when its payoff is infinite
+            with np.errstate(invalid="ignore"):
+                return np.where(width == 0, 0.0, width * payoff)
+
+        ante, _ = cls.outcome_coefficients()
+        contributions = np.zeros((len(cls.OUTCOMES), flat.size))
+        contributions[0] = np.where(bluff, width_times(1 - c, -showdown), 0)  # Bluff_Called
+        contributions[1] = np.where(bluff, c * ante[1], 0)  # Bluff_Fold
+        contributions[2] = np.where(value, c * ante[2], 0)  # Value_Fold
+        contributions[3] = np.where(value, width_times(1 - x_call, -showdown), 0)  # Value_Loses
+        contributions[4] = np.where(value, width_times(x_call - c, showdown), 0)  # Value_Wins
+        contributions[5] = np.where(check, flat * ante[5], 0)  # Check_Wins
+        contributions[6] = np.where(check, (1 - flat) * ante[6], 0)  # Check_Loses
+        contributions[:, errors] = np.nan
+        return contributions.reshape((len(cls.OUTCOMES),) + x.shape)
+
+    @classmethod
+    def expected_payoff_adaptive(cls, tol=1e-8, outcome=None, breakpoints=None, **kwargs):
+        '''
+        Expected payoff for the bettor, with an error estimate: returns (estimate, error).
+        The integral over the caller's hand y is exact (see outcome_payoffs_x). The integral over the bettor's hand x is
+        adaptive Gauss-Kronrod, split at the bluff and value thresholds (where the payoff jumps) and at any extra breakpoints
+        (e.g. kinks in the sizing functions), so only the intervals where the payoff is not yet resolved are refined.
+        If outcome is given, only the payoff from that outcome is integrated (as in total_payoff_for_outcome).
+        '''
+        thresholds = [cls.bluff_threshold(**kwargs), cls.value_threshold(**kwargs)] + list(breakpoints or [])
+        rows = slice(None) if outcome is None else [cls.OUTCOMES.index(outcome)]
+        payoff_x = lambda x: np.nansum(cls.outcome_payoffs_x(x, **kwargs)[rows], axis=0)
+        return integrate(payoff_x, 0, 1, method="adaptive", vectorized=True, breakpoints=thresholds, tol=tol, full_output=True)
+
+    @classmethod
+    def expected_payoff_qmc(cls, n=2**16, seed=None, tol=None, n_scrambles=8, batch_size=2**10, outcome=None, **kwargs):
+        '''
+        Randomized quasi-Monte Carlo estimate of the expected payoff for the bettor, with its standard error: returns (estimate, error).
+        Only needs the vectorized payoff (payoff_outcome_array), so it suits variants whose strategies are black-box functions.
+        n_scrambles independently scrambled Sobol sequences of (x, y) points are drawn, each up to n points (rounded up to a power of 2).
+        The estimate is the mean of the per-scramble means, and the error is their standard error.
+        Points are drawn in batches: batch_size points first, then doubling, so every sequence prefix stays a power of 2 (which keeps
+        Sobol points balanced). Sampling stops early once the error is at most tol.
+        Non-finite payoffs are left out, as in the grid method. If outcome is given, only the payoff from that outcome is counted.
+        '''
+        rng = np.random.default_rng(seed)
+        samplers = [qmc.Sobol(d=2, scramble=True, seed=rng) for _ in range(n_scrambles)]
+        sums, counts = np.zeros(n_scrambles), np.zeros(n_scrambles)
+        drawn, batch = 0, batch_size
+        while True:
+            for k, sampler in enumerate(samplers):
+                points = sampler.random(batch)
+                payoff, codes = cls.payoff_outcome_array(points[:, 0], points[:, 1], **kwargs)
+                if outcome is not None:
+                    payoff = np.where(codes == cls.OUTCOMES.index(outcome), payoff, 0)
+                finite = np.isfinite(payoff)
+                sums[k] += payoff[finite].sum()
+                counts[k] += finite.sum()
+            drawn += batch
+            means = sums / counts
+            error = means.std(ddof=1) / np.sqrt(n_scrambles)
+            if drawn >= n or (tol is not None and error <= tol):
+                return means.mean(), error
+            batch = drawn
+
     @classmethod
     def payoff_outcome(cls, x, y, **kwargs):
         if x < cls.bluff_threshold(**kwargs): # bluff
@@ -84,39 +278,94 @@ class ContinuousPokerTemplate:
         return cls.outcome_to_payoff(outcome, s), outcome
             
     @classmethod
-    def expected_payoff(cls, grid_size=1001, **kwargs):
+    def expected_payoff(cls, grid_size=1001, method="grid", tol=None, n=2**16, seed=None, **kwargs):
+        '''
+        Expected payoff for the bettor.
+        method:
+            - "grid": average the payoff over a grid_size x grid_size grid of [0,1] x [0,1]
+            - "adaptive": see expected_payoff_adaptive, accurate to about tol (default 1e-8)
+            - "qmc": see expected_payoff_qmc, with up to n points per scramble, stopping early once the standard error is below tol (if given)
+        '''
+        if method == "adaptive":
+            return cls.expected_payoff_adaptive(tol=1e-8 if tol is None else tol, **kwargs)[0]
+        if method == "qmc":
+            return cls.expected_payoff_qmc(n=n, seed=seed, tol=tol, **kwargs)[0]
+        if method != "grid":
+            raise ValueError(f"Unknown method {method}")
         # numerically integrate the payoff(x, y) function over the grid [0,1] x [0,1]
-        xs = np.linspace(0, 1, grid_size)
-        ys = np.linspace(0, 1, grid_size)
-        payoff_data = np.empty((grid_size, grid_size))
-        for i in range(grid_size):
-            for j in range(grid_size):
-                try:
-                    val, _ = cls.payoff_outcome(xs[i], ys[j], **kwargs)
-                    payoff_data[i, j] = val if np.isfinite(val) else np.nan
-                except:
-                    payoff_data[i, j] = np.nan
-        average_payoff = np.nanmean(payoff_data)
+        payoff_data, _ = cls.payoff_grid(grid_size, **kwargs)
+        average_payoff = payoff_data[np.isfinite(payoff_data)].mean(dtype=np.float64)
         return average_payoff
     
     @classmethod
-    def total_payoff_for_outcome(cls, outcome, grid_size=1001, **kwargs):
-        # numerically integrate the payoff(x, y) function over the grid [0,1] x [0,1], only where the outcome is outcome
+    def total_payoff_for_outcome(cls, outcome, grid_size=1001, method="grid", tol=None, n=2**16, seed=None, **kwargs):
+        if method == "adaptive":
+            return cls.expected_payoff_adaptive(tol=1e-8 if tol is None else tol, outcome=outcome, **kwargs)[0]
+        if method == "qmc":
+            return cls.expected_payoff_qmc(n=n, seed=seed, tol=tol, outcome=outcome, **kwargs)[0]
+        if method != "grid":
+            raise ValueError(f"Unknown method {method}")
+        return cls.payoff_breakdown(grid_size=grid_size, **kwargs)[outcome]["total_payoff"]
+
+    @classmethod
+    def payoff_grid(cls, grid_size=1001, **kwargs):
+        '''
+        Return (payoff, codes), the payoff_outcome_array of the grid_size x grid_size grid of [0,1] x [0,1], indexed [x, y],
+        as float32 payoffs and int8 outcome codes.
+        Grids are memoized per (variant, params, grid_size), so expected_payoff, payoff_breakdown and generate_payoff_plot
+        with the same arguments share one evaluation. The arrays are read-only, copy them before modifying.
+        '''
+        try:
+            return cls._cached_payoff_grid(grid_size, tuple(sorted(kwargs.items())))
+        except TypeError:
+            # unhashable params (e.g. arrays), not memoized
+            return cls._compute_payoff_grid(grid_size, **kwargs)
+
+    @classmethod
+    @lru_cache(maxsize=16)
+    def _cached_payoff_grid(cls, grid_size, params):
+        return cls._compute_payoff_grid(grid_size, **dict(params))
+
+    @classmethod
+    def _compute_payoff_grid(cls, grid_size, **kwargs):
         xs = np.linspace(0, 1, grid_size)
         ys = np.linspace(0, 1, grid_size)
-        payoff_data = np.empty((grid_size, grid_size))
-        for i in range(grid_size):
-            for j in range(grid_size):
-                try:
-                    val, oc = cls.payoff_outcome(xs[i], ys[j], **kwargs)
-                    if oc == outcome:
-                        payoff_data[i, j] = val if np.isfinite(val) else np.nan
-                    else:
-                        payoff_data[i, j] = 0
-                except:
-                    payoff_data[i, j] = 0
-        total_payoff = np.nanmean(payoff_data)
-        return total_payoff
+        payoff, codes = cls.payoff_outcome_array(xs[:, None], ys[None, :], **kwargs)
+        payoff = payoff.astype(np.float32)
+        payoff.flags.writeable = False
+        codes.flags.writeable = False
+        return payoff, codes
+
+    @classmethod
+    def payoff_breakdown(cls, grid_size=1001, return_arrays=False, **kwargs):
+        '''
+        Break the expected payoff for the bettor down by outcome, from a single evaluation of the grid_size x grid_size grid of [0,1] x [0,1].
+        Returns a dict from each outcome in OUTCOMES to a dict with:
+            - "probability": the fraction of (x, y) with that outcome
+            - "total_payoff": the contribution of that outcome to expected_payoff (the total_payoffs sum to expected_payoff)
+            - "mean_payoff": the average payoff given that outcome (nan if the outcome never happens)
+        Points with a non-finite payoff are left out, as in expected_payoff.
+        If return_arrays, returns (breakdown, payoff, codes), with the (read-only) grids from payoff_grid.
+        '''
+        payoff, codes = cls.payoff_grid(grid_size, **kwargs)
+        finite = np.isfinite(payoff)
+        n_finite = np.count_nonzero(finite)
+        n_outcomes = len(cls.OUTCOMES)
+        counts = np.bincount(codes[finite], minlength=n_outcomes)
+        totals = np.bincount(codes[finite], weights=payoff[finite], minlength=n_outcomes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = totals / counts
+        breakdown = {
+            outcome: {
+                "probability": counts[k] / n_finite,
+                "total_payoff": totals[k] / n_finite,
+                "mean_payoff": means[k],
+            }
+            for k, outcome in enumerate(cls.OUTCOMES)
+        }
+        if return_arrays:
+            return breakdown, payoff, codes
+        return breakdown
 
     @classmethod
     def generate_strategy_plot(cls, s_lim=None, grid_size=1001, save_path=None, title=None, show=True, **kwargs):
@@ -205,27 +454,20 @@ class ContinuousPokerTemplate:
         # ---- Parameters ----
         xs = np.linspace(0, 1, grid_size)
         ys = np.linspace(0, 1, grid_size)
-        X, Y = np.meshgrid(xs, ys, indexing='ij')
         color_cap = 2
 
         # ---- Compute payoff grid ----
-        payoff_data = np.empty((grid_size, grid_size))
-        outcome_type = np.empty((grid_size, grid_size), dtype=object)
-        for i in range(grid_size):
-            for j in range(grid_size):
-                try:
-                    val, outcome = cls.payoff_outcome(xs[i], ys[j], **kwargs)
-                    payoff_data[i, j] = val if np.isfinite(val) else np.nan
-                    outcome_type[i, j] = outcome
-                except:
-                    payoff_data[i, j] = np.nan
-        payoff_clipped = np.clip(payoff_data, -color_cap, color_cap)
-
-        region_labels = [
-            "Bluff_Called", "Bluff_Fold",
-            "Value_Wins", "Value_Loses", "Value_Fold",
-            "Check_Wins", "Check_Loses"
-        ]
+        payoff_data, codes = cls.payoff_grid(grid_size, **kwargs)
+        payoff_clipped = np.clip(np.where(np.isfinite(payoff_data), payoff_data, np.nan), -color_cap, color_cap)
+
+        # centroid of each outcome region, from the coordinate sums of its grid points
+        valid = codes >= 0
+        n_outcomes = len(cls.OUTCOMES)
+        counts = np.bincount(codes[valid], minlength=n_outcomes)
+        X, Y = np.broadcast_arrays(xs[:, None], ys[None, :])
+        with np.errstate(invalid="ignore"):
+            center_xs = np.bincount(codes[valid], weights=X[valid], minlength=n_outcomes) / counts
+            center_ys = np.bincount(codes[valid], weights=Y[valid], minlength=n_outcomes) / counts
 
         # ---- Plot heatmap with region contours and labels ----
         fig, ax = plt.subplots(figsize=(7, 7))
@@ -241,27 +483,24 @@ class ContinuousPokerTemplate:
         cbar.set_ticks([-color_cap, 0, color_cap])
         cbar.set_ticklabels([f"<-{color_cap}", "0", f">{color_cap}"])
 
-        for label in region_labels:
-            mask = outcome_type == label
-            if np.any(mask):
-                ax.contour(
-                    X, Y, mask.astype(float),
-                    levels=[0.5],
-                    colors='white',
-                    linewidths=1.5
-                )
-                region_center = np.argwhere(mask)
-                if len(region_center) > 0:
-                    center_x, center_y = region_center.mean(axis=0)
-                    ax.text(
-                        xs[int(center_x)], ys[int(center_y)],
-                        label.replace("_", " "),
-                        color="white",
-                        fontsize=10,
-                        ha="center",
-                        va="center",
-                        bbox=dict(facecolor="black", alpha=0.5, edgecolor="none")
-                    )
+        for code, label in enumerate(cls.OUTCOMES):
+            if counts[code] == 0:
+                continue
+            ax.contour(
+                xs, ys, (codes == code).T.view(np.uint8),
+                levels=[0.5],
+                colors='white',
+                linewidths=1.5
+            )
+            ax.text(
+                center_xs[code], center_ys[code],
+                label.replace("_", " "),
+                color="white",
+                fontsize=10,
+                ha="center",
+                va="center",
+                bbox=dict(facecolor="black", alpha=0.5, edgecolor="none")
+            )
 
         ax.set_xlabel("x (bettor hand strength)")
         ax.set_ylabel("y (caller hand strength)")
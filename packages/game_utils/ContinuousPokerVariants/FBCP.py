@@ -1,3 +1,4 @@
+import numpy as np
 from game_utils.ContinuousPokerVariants.ContinousPokerTemplate import ContinuousPokerTemplate
 
 # FIXED BET CONTINUOUS POKER 
@@ -23,4 +24,22 @@ class FBCP(ContinuousPokerTemplate):
 
     @staticmethod
     def value_size(x, B):
-        return B
\ No newline at end of file
+        return B
+
+    # ---- Exact payoff ----
+
+    @classmethod
+    def expected_payoff_exact(cls, B):
+        '''
+        Exact expected payoff for the bettor, by integrating each region of x analytically. Vectorized over B.
+        The bet size, and so the call threshold, is the same for every bet, so the bluff payoff is constant in x
+        and the value payoff is linear in x. This simplifies to B / (2 (B + 2) (2B + 1)).
+        '''
+        B = np.asarray(B, dtype=np.float64)
+        a, v = cls.bluff_threshold(B), cls.value_threshold(B)
+        c = cls.call_threshold(B)
+        bluff = a * cls.bluff_payoff_x(B, c)
+        check = cls.check_payoff_integral(a, v)
+        # the value payoff is linear in x, so its integral is the width times the midpoint value
+        value = (1 - v) * cls.value_payoff_x((1 + v) / 2, B, c)
+        return bluff + check + value
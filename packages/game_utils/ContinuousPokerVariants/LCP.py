@@ -1,4 +1,4 @@
-# from game_utils.utils import *
+from game_utils.utils import integrate, compute_area, double_integral, inverse_integration
 from game_utils.ContinuousPokerVariants.ContinousPokerTemplate import ContinuousPokerTemplate
 from scipy.optimize import root_scalar
 import numpy as np
@@ -180,7 +180,39 @@ class LCP_utils:
     # integrate s(x) over the strip using the inverse integration trick with x=v(s).
     # integrate the strips over y.4
 
+    class LinearBound:
+        """ A region bound x = slope * y + intercept. Regions integrate linear (and constant) bounds in closed form. """
+        def __init__(self, slope, intercept):
+            self.slope = slope
+            self.intercept = intercept
+
+        def __call__(self, y):
+            return self.slope * y + self.intercept
+
+        def __repr__(self):
+            return f"LinearBound({self.slope} * y + {self.intercept})"
+
+    BOUND_TYPES = ("constant", "linear", "general")
+
+    @staticmethod
+    def as_bound(bound):
+        """ Return (callable bound, bound type). A number is a constant bound, a LinearBound a linear one, any other callable general. """
+        if isinstance(bound, LCP_utils.LinearBound):
+            return bound, "constant" if bound.slope == 0 else "linear"
+        if callable(bound):
+            return bound, "general"
+        return LCP_utils.LinearBound(0, bound), "constant"
+
+    # every region integral is vectorized: the bounds and integrands are evaluated on whole arrays of y (and x).
+    # method is passed on to utils.integrate, with grid_size as the number of points or nodes.
     class Region:
+        def _set_bounds(self, x_min_of_y, x_max_of_y):
+            """ Set the x bounds, and the bound type of the region: the most general type of its two bounds. """
+            self.x_min_of_y, min_type = LCP_utils.as_bound(x_min_of_y)
+            self.x_max_of_y, max_type = LCP_utils.as_bound(x_max_of_y)
+            self.bound_type = max(min_type, max_type, key=LCP_utils.BOUND_TYPES.index)
+            self._areas = {}
+
         def point_in_region(self, x, y):
             return self.x_in_bounds(x) and self.y_in_bounds(y)
         
@@ -190,15 +222,27 @@ class LCP_utils:
         def y_in_bounds(self, y):
             return self.y_min <= y < self.y_max
         
-        def compute_area(self, grid_size=101):
-            return compute_area(self.x_min_of_y, self.x_max_of_y, self.y_min, self.y_max, grid_size)
+        def compute_area(self, grid_size=101, method="gauss"):
+            '''
+            Area of the region, computed once and cached.
+            With constant or linear bounds the width is linear in y, so the area is exact, and the same for every grid_size and method.
+            '''
+            key = None if self.bound_type != "general" else (grid_size, method)
+            if key not in self._areas:
+                if self.bound_type != "general":
+                    slope = self.x_max_of_y.slope - self.x_min_of_y.slope
+                    intercept = self.x_max_of_y.intercept - self.x_min_of_y.intercept
+                    self._areas[key] = slope * (self.y_max**2 - self.y_min**2) / 2 + intercept * (self.y_max - self.y_min)
+                else:
+                    self._areas[key] = compute_area(self.x_min_of_y, self.x_max_of_y, self.y_min, self.y_max, grid_size, method=method, vectorized=True)
+            return self._areas[key]
         
-        def compute_s_integral(self, grid_size=101):
+        def compute_s_integral(self, grid_size=101, method="gauss"):
             raise NotImplementedError("compute_s_integral method must be implemented in subclasses")
         
-        def compute_payoff(self, grid_size=101):
-            area = self.compute_area(grid_size=grid_size)
-            s_integral = self.compute_s_integral(grid_size=grid_size)
+        def compute_payoff(self, grid_size=101, method="gauss"):
+            area = self.compute_area(grid_size=grid_size, method=method)
+            s_integral = self.compute_s_integral(grid_size=grid_size, method=method)
             return self.payoff_func(s_integral, area)
         
         def compute_payoff_vert_strip(self, grid_size=101):
@@ -206,44 +250,45 @@ class LCP_utils:
 
     class InverseRegion(Region):
         def __init__(self, s_left_of_y, s_right_of_y, y_min, y_max, payoff_func, x_of_s):
-            self.s_left_of_y = s_left_of_y
-            self.s_right_of_y = s_right_of_y
-            self.x_min_of_y = lambda y: x_of_s(self.s_left_of_y(y))
-            self.x_max_of_y = lambda y: x_of_s(self.s_right_of_y(y))
+            # a constant s bound gives a constant x bound
+            self.s_left_of_y, _ = LCP_utils.as_bound(s_left_of_y)
+            self.s_right_of_y, _ = LCP_utils.as_bound(s_right_of_y)
+            self._set_bounds(
+                x_of_s(s_left_of_y) if not callable(s_left_of_y) else lambda y: x_of_s(self.s_left_of_y(y)),
+                x_of_s(s_right_of_y) if not callable(s_right_of_y) else lambda y: x_of_s(self.s_right_of_y(y)),
+            )
             self.y_min = y_min
             self.y_max = y_max
             self.payoff_func = payoff_func
             self.x_of_s = x_of_s
 
-        def compute_s_integral(self, grid_size=101):
-            integrand = lambda y: inverse_integration(self.x_of_s, self.s_left_of_y(y), self.s_right_of_y(y), grid_size)
-            return integrate(integrand, self.y_min, self.y_max, grid_size)
+        def compute_s_integral(self, grid_size=101, method="gauss"):
+            integrand = lambda y: inverse_integration(self.x_of_s, self.s_left_of_y(y), self.s_right_of_y(y), grid_size, method=method, vectorized=True)
+            return integrate(integrand, self.y_min, self.y_max, grid_size, method=method, vectorized=True)
         
     class VariableRegion(Region):
         def __init__(self, x_min_of_y, x_max_of_y, y_min, y_max, payoff_func, s_of_xy):
-            self.x_min_of_y = x_min_of_y
-            self.x_max_of_y = x_max_of_y
+            self._set_bounds(x_min_of_y, x_max_of_y)
             self.y_min = y_min
             self.y_max = y_max
             self.payoff_func = payoff_func
             self.s_of_xy = s_of_xy
 
-        def compute_s_integral(self, grid_size=101):
-            integrand = lambda y: integrate(lambda x: self.s_of_xy(x, y), self.x_min_of_y(y), self.x_max_of_y(y), grid_size)
-            return integrate(integrand, self.y_min, self.y_max, grid_size)
+        def compute_s_integral(self, grid_size=101, method="gauss"):
+            return double_integral(self.s_of_xy, self.x_min_of_y, self.x_max_of_y, self.y_min, self.y_max, grid_size, method=method, vectorized=True)
     
         
     class ConstRegion(Region):
         def __init__(self, x_min_of_y, x_max_of_y, y_min, y_max, payoff_func, s):
-            self.x_min_of_y = x_min_of_y
-            self.x_max_of_y = x_max_of_y
+            self._set_bounds(x_min_of_y, x_max_of_y)
             self.y_min = y_min
             self.y_max = y_max
             self.payoff_func = payoff_func
             self.s = s
 
-        def compute_s_integral(self, grid_size=101):
-            area = self.compute_area(grid_size=grid_size)
+        def compute_s_integral(self, grid_size=101, method="gauss"):
+            # s is constant, so this reuses the cached area
+            area = self.compute_area(grid_size=grid_size, method=method)
             s_integral = self.s * area
             return s_integral
     
@@ -351,10 +396,11 @@ class LCP(ContinuousPokerTemplate):
         L = game_params['L']
 
         # ----- Bluff Called -----
+        # bounds are numbers (constant), LCP_utils.LinearBound (linear in y) or functions of y (general)
         # r0: x < b(U), y > c(U), s = U
         r0 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: 0,
-            x_max_of_y=lambda y: b(U),
+            x_min_of_y=0,
+            x_max_of_y=b(U),
             y_min=c(U),
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -363,8 +409,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r1: b(U) < x < b(L), y > c(U), b(s) = x
         r1 = LCP_utils.InverseRegion(
-            s_left_of_y=lambda y: U,
-            s_right_of_y=lambda y: L,
+            s_left_of_y=U,
+            s_right_of_y=L,
             y_min=c(U),
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -374,7 +420,7 @@ class LCP(ContinuousPokerTemplate):
         # r2: b(c_inv(y)) < x < b(L), c(L) < y < c(U), b(s) = x
         r2 = LCP_utils.InverseRegion(
             s_left_of_y=lambda y: c_inv(y),
-            s_right_of_y=lambda y: L,
+            s_right_of_y=L,
             y_min=c(L),
             y_max=c(U),
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -383,8 +429,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r3: b(L) < x < bth, y > c(L), s = L
         r3 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: b(L),
-            x_max_of_y=lambda y: bth,
+            x_min_of_y=b(L),
+            x_max_of_y=bth,
             y_min=c(L),
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -394,8 +440,8 @@ class LCP(ContinuousPokerTemplate):
         # ---- Bluff Fold -----
         # r4: x < b(U), c(L) < y < c(U)
         r4 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: 0,
-            x_max_of_y=lambda y: b(U),
+            x_min_of_y=0,
+            x_max_of_y=b(U),
             y_min=c(L),
             y_max=c(U),
             payoff_func=ContinuousPokerTemplate.win_ante_payoff,
@@ -404,7 +450,7 @@ class LCP(ContinuousPokerTemplate):
 
         # r5: b(U) < x < b(c_inv(y)), c(L) < y < c(U)
         r5 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: b(U),
+            x_min_of_y=b(U),
             x_max_of_y=lambda y: b(c_inv(y)),
             y_min=c(L),
             y_max=c(U),
@@ -414,8 +460,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r6: x < bth, y < c(L)
         r6 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: 0,
-            x_max_of_y=lambda y: bth,
+            x_min_of_y=0,
+            x_max_of_y=bth,
             y_min=0,
             y_max=c(L),
             payoff_func=ContinuousPokerTemplate.win_ante_payoff,
@@ -425,8 +471,8 @@ class LCP(ContinuousPokerTemplate):
         # ----- Check Loses -----
         # r7: bth < x < vth, y > vth
         r7 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: bth,
-            x_max_of_y=lambda y: vth,
+            x_min_of_y=bth,
+            x_max_of_y=vth,
             y_min=vth,
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_ante_payoff,
@@ -440,8 +486,8 @@ class LCP(ContinuousPokerTemplate):
         
         # r10: bth < x < vth, y < bth
         r10 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: bth,
-            x_max_of_y=lambda y: vth,
+            x_min_of_y=bth,
+            x_max_of_y=vth,
             y_min=0,
             y_max=bth,
             payoff_func=ContinuousPokerTemplate.win_ante_payoff,
@@ -451,8 +497,8 @@ class LCP(ContinuousPokerTemplate):
         # ----- Value Loses -----
         # r11: vth < x < v(L), y > v(L), s=L
         r11 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: vth,
-            x_max_of_y=lambda y: v(L),
+            x_min_of_y=vth,
+            x_max_of_y=v(L),
             y_min=v(L),
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -463,8 +509,8 @@ class LCP(ContinuousPokerTemplate):
         
         # r13: v(L) < x < v(U), v(U) < y < 1, s=v_inv(x)
         r13 = LCP_utils.VariableRegion(
-            x_min_of_y=lambda y: v(L),
-            x_max_of_y=lambda y: v(U),
+            x_min_of_y=v(L),
+            x_max_of_y=v(U),
             y_min=v(U),
             y_max=1,
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -473,8 +519,8 @@ class LCP(ContinuousPokerTemplate):
             
         # r14: v(L) < x < y, v(L) < y < v(U), x=v_inv(s) 
         r14 = LCP_utils.VariableRegion(
-            x_min_of_y=lambda y: v(L),
-            x_max_of_y=lambda y: y,
+            x_min_of_y=v(L),
+            x_max_of_y=LCP_utils.LinearBound(1, 0),
             y_min=v(L),
             y_max=v(U),
             payoff_func=ContinuousPokerTemplate.lose_showdown_payoff,
@@ -488,8 +534,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r17: vth < x < v(L), c(L) < y < vth, s=L
         r17 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: vth,
-            x_max_of_y=lambda y: v(L),
+            x_min_of_y=vth,
+            x_max_of_y=v(L),
             y_min=c(L),
             y_max=vth,
             payoff_func=ContinuousPokerTemplate.win_showdown_payoff,
@@ -498,8 +544,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r18: y < x < v(U), v(L) < y < v(U), s=v_inv(x)
         r18 = LCP_utils.VariableRegion(
-            x_min_of_y=lambda y: y,
-            x_max_of_y=lambda y: v(U),
+            x_min_of_y=LCP_utils.LinearBound(1, 0),
+            x_max_of_y=v(U),
             y_min=v(L),
             y_max=v(U),
             payoff_func=ContinuousPokerTemplate.win_showdown_payoff,
@@ -508,8 +554,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r19: v(L) < x < v(U), c(U) < y < v(L), v(s)=x
         r19 = LCP_utils.InverseRegion(
-            s_left_of_y=lambda y: L,
-            s_right_of_y=lambda y: U,
+            s_left_of_y=L,
+            s_right_of_y=U,
             y_min=c(U),
             y_max=v(L),
             payoff_func=ContinuousPokerTemplate.win_showdown_payoff,
@@ -518,7 +564,7 @@ class LCP(ContinuousPokerTemplate):
 
         # r20: v(L) < x < v(c_inv(y)), c(L) < y < c(U), v(s)=x
         r20 = LCP_utils.InverseRegion(
-            s_left_of_y=lambda y: L,
+            s_left_of_y=L,
             s_right_of_y=lambda y: c_inv(y),
             y_min=c(L),
             y_max=c(U),
@@ -530,8 +576,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r22: x > v(U), c(U) < y < v(U), s=U
         r22 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: v(U),
-            x_max_of_y=lambda y: 1,
+            x_min_of_y=v(U),
+            x_max_of_y=1,
             y_min=c(U),
             y_max=v(U),
             payoff_func=ContinuousPokerTemplate.win_showdown_payoff,
@@ -542,7 +588,7 @@ class LCP(ContinuousPokerTemplate):
         # r23: v(c_inv(y)) < x, c(L) < y < c(U)
         r23 = LCP_utils.ConstRegion(
             x_min_of_y=lambda y: v(c_inv(y)),
-            x_max_of_y=lambda y: 1,
+            x_max_of_y=1,
             y_min=c(L),
             y_max=c(U),
             payoff_func=ContinuousPokerTemplate.win_ante_payoff,
@@ -551,8 +597,8 @@ class LCP(ContinuousPokerTemplate):
 
         # r24: x > vth, y < c(L)
         r24 = LCP_utils.ConstRegion(
-            x_min_of_y=lambda y: vth,
-            x_max_of_y=lambda y: 1,
+            x_min_of_y=vth,
+            x_max_of_y=1,
             y_min=0,
             y_max=c(L),
             payoff_func=ContinuousPokerTemplate.win_ante_payoff,
@@ -594,16 +640,16 @@ class LCP(ContinuousPokerTemplate):
         return fig, ax
 
     @classmethod
-    def expected_payoff_by_region(cls, grid_size=1001, **kwargs):
+    def expected_payoff_by_region(cls, grid_size=101, method="gauss", **kwargs):
         '''
         Compute the integral over the square by regions to avoid ever solving for v_inv and b_inv.
-        Not any faster than the numerical integration, but proof of concept for a symbolic integration.
+        Each region is integrated with vectorized quadrature (see utils.integrate for the methods).
         '''
         regions = cls.get_regions(**kwargs)
 
         total_payoff = 0
         for i, r in regions.items():
-            payoff = r.compute_payoff() 
+            payoff = r.compute_payoff(grid_size=grid_size, method=method) 
             # print(f"Payoff for region {i}: {payoff}")
             total_payoff+= payoff
         return total_payoff
\ No newline at end of file
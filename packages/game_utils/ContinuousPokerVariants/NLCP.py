@@ -23,6 +23,21 @@ class NLCP(ContinuousPokerTemplate):
     def value_size(x):
         return np.sqrt(3 / (7 * (1 - x))) - 1
     
+    @classmethod
+    def expected_payoff_exact(cls):
+        '''
+        Exact expected payoff for the bettor, by integrating each region of x analytically. Equals 1/14.
+        '''
+        a, v = cls.bluff_threshold(), cls.value_threshold()
+        # the bluff sizes make the bettor's payoff the same for every bluffing hand, so evaluate it at x = a
+        s_a = cls.bluff_size(a)
+        bluff = a * cls.bluff_payoff_x(s_a, cls.call_threshold(s_a))
+        check = cls.check_payoff_integral(a, v)
+        # substituting value_size and call_threshold, the value payoff of hand x is 33/14 - x - (4 sqrt(21) / 7) sqrt(1 - x)
+        value_antiderivative = lambda x: 33 * x / 14 - x**2 / 2 + (8 * np.sqrt(21) / 21) * (1 - x)**1.5
+        value = value_antiderivative(1) - value_antiderivative(v)
+        return bluff + check + value
+
     @classmethod
     def generate_strategy_plot(cls, s_lim=None, grid_size=1001, save_path=None, title=None):
         # no game params for this variant
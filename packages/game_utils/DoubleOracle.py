@@ -0,0 +1,89 @@
+import numpy as np
+import time
+from game_utils.LP import solve_normal_zero_sum_primal_dual
+from game_utils.Strategy import MixedStrategy, PureStrategy
+from game_utils.ZeroSumGame import ZeroSumGame
+
+
+class DoubleOracleSolver:
+    """
+    Double Oracle solver for two-player zero-sum games.
+    Instead of enumerating every pure strategy, it keeps a small restricted set of pure strategies for each player.
+    Each iteration solves the restricted normal-form game with a single primal-dual linear program, then adds each player's
+    best response (computed directly from the game tree) to the restricted sets.
+    It stops when neither best response improves on the restricted game value, which makes the solution exact.
+    The full payoff matrix is never built.
+
+    Example usage:
+
+    solver = DoubleOracle.DoubleOracleSolver(kuhn.Kuhn.nCard(5))
+    solver.solve()
+    strat1, strat2 = solver.get_strategy(0), solver.get_strategy(1)
+    print(solver.value, solver.bounds[-1])
+    """
+    def __init__(self, game_class: ZeroSumGame):
+        self.game_class = game_class
+        # restricted pure strategy sets, start from the first action at every info set
+        self.strategies = [[self._initial_strategy(0)], [self._initial_strategy(1)]]
+        self.payoffs = np.array([[game_class.expected_payoff_exact(self.strategies[0][0], self.strategies[1][0])]])
+        self.frequencies = [np.ones(1), np.ones(1)]
+        self.value = self.payoffs[0, 0]
+        self.bounds = []  # (lower, upper) bounds on the game value, one pair per iteration
+
+    def _initial_strategy(self, player):
+        info_sets = self.game_class.all_info_sets(player)
+        return PureStrategy({I: self.game_class.get_actions_at_info_set(I)[0] for I in info_sets}, self.game_class)
+
+    def _add_strategy(self, player, strategy):
+        """ Add a pure strategy to the restricted set of player, and extend the payoff matrix with its payoffs. """
+        self.strategies[player].append(strategy)
+        if player == 0:
+            row = [self.game_class.expected_payoff_exact(strategy, s) for s in self.strategies[1]]
+            self.payoffs = np.concat([self.payoffs, np.array([row])], axis=0)
+        else:
+            col = [self.game_class.expected_payoff_exact(s, strategy) for s in self.strategies[0]]
+            self.payoffs = np.concat([self.payoffs, np.array([col]).T], axis=1)
+
+    def solve(self, tol=1e-9, max_iterations=1000, verbose=True):
+        """
+        Run double oracle until the bounds on the game value are within tol, or max_iterations is reached.
+        Returns the value of the game for player 1.
+        """
+        start_time = time.time()
+
+        for i in range(max_iterations):
+            self.frequencies[0], self.frequencies[1], self.value = solve_normal_zero_sum_primal_dual(self.payoffs)
+
+            best_response1, upper = self.game_class.best_response(self.get_strategy(1), 0)
+            best_response2, opponent_value = self.game_class.best_response(self.get_strategy(0), 1)
+            lower = -opponent_value
+            self.bounds.append((lower, upper))
+
+            if verbose:
+                print(f"  Iteration {i + 1:4d}: "
+                      f"support sizes: {len(self.strategies[0]):4d} x {len(self.strategies[1]):4d}, "
+                      f"bounds: [{lower:.6f}, {upper:.6f}], "
+                      f"elapsed: {time.time() - start_time:7.2f}s")
+
+            if upper - lower <= tol:
+                break
+
+            added = False
+            if upper > self.value + tol and best_response1 not in self.strategies[0]:
+                self._add_strategy(0, best_response1)
+                added = True
+            if lower < self.value - tol and best_response2 not in self.strategies[1]:
+                self._add_strategy(1, best_response2)
+                added = True
+            if not added:
+                break
+
+        if verbose:
+            print(f"\nDouble oracle complete!")
+            print(f"  Game value: {self.value:.6f}")
+            print(f"  Total time: {time.time() - start_time:.2f}s")
+        return self.value
+
+    def get_strategy(self, player):
+        """ Return the restricted equilibrium strategy for the given player as a MixedStrategy object."""
+        return MixedStrategy.from_pure_strategies(self.strategies[player], self.frequencies[player], player, self.game_class)
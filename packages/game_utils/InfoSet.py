@@ -1,8 +1,74 @@
-from dataclasses import dataclass
+from dataclasses import FrozenInstanceError
 
 
-@dataclass(frozen=True)
 class InfoSet:
-    type: str
-    history: tuple
-    
\ No newline at end of file
+    """
+    An information set: the type of the player to act and the history they have observed.
+
+    InfoSets are interned. InfoSet(type, history) returns the one canonical instance for (type, history),
+    so building the same info set again allocates nothing, and its hash is computed only once.
+    Each canonical instance also gets a dense integer id (in order of first creation), which can be used for array indexing.
+    Instances are immutable, compare and hash like the (type, history) dataclass they replace, and unpickle to the canonical instance.
+    """
+    __slots__ = ("type", "history", "id", "_hash")
+    _registry = {}  # (type, history) -> canonical InfoSet
+    _UNSET = object()
+
+    def __new__(cls, type=_UNSET, history=_UNSET):
+        if type is cls._UNSET or history is cls._UNSET:
+            # pickles of the old dataclass call cls.__new__(cls) and then __setstate__, which fills in the fields
+            return object.__new__(cls)
+        key = (type, history)
+        info_set = cls._registry.get(key)
+        if info_set is None:
+            object.__new__(cls)._intern(type, history)
+            info_set = cls._registry[key]
+        return info_set
+
+    def _intern(self, type, history):
+        """ Set the fields of a new instance, and register it unless (type, history) is already interned,
+        in which case it takes the id and hash of the canonical instance. """
+        key = (type, history)
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "history", history)
+        object.__setattr__(self, "_hash", hash(key))
+        object.__setattr__(self, "id", len(self._registry))
+        # another thread (or an earlier unpickle) may have interned the same key in the meantime, keep theirs
+        canonical = self._registry.setdefault(key, self)
+        if canonical is not self:
+            object.__setattr__(self, "id", canonical.id)
+
+    def __setstate__(self, state):
+        # only reached when loading pickles of the old dataclass, whose state is its __dict__
+        # (or (None, slot dict) for some protocols); new pickles go through __reduce__
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        self._intern(state["type"], state["history"])
+
+    @classmethod
+    def count(cls):
+        """ Return the number of distinct InfoSets created so far, one more than the largest id. """
+        return len(cls._registry)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.type == other.type and self.history == other.history
+
+    def __reduce__(self):
+        # unpickling and copying go through __new__, and so return the canonical instance
+        return (self.__class__, (self.type, self.history))
+
+    def __repr__(self):
+        return f"InfoSet(type={self.type!r}, history={self.history!r})"
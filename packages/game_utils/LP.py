@@ -1,23 +1,11 @@
 from scipy.optimize import linprog
 import numpy as np
 
-def solve_normal_zero_sum(payoffs, player=0):
+def _solve_row_player_lp(payoffs):
     '''
-    Solves a normal-form zero-sum game using linear programming.
-    Parameters:
-    payoffs (numpy.ndarray): A 2D array representing the payoff matrix for player 1. 
-                             The rows correspond to player 1's strategies, and the columns 
-                             correspond to player 2's strategies.
-    player: 0 for row chooser, 1 for column chooser.
-    Returns:
-    tuple: A tuple containing:
-        - numpy.ndarray: The optimal mixed strategy for player 1.
-        - float: The value of the game.
-    Raises:
-    ValueError: If the linear programming solver fails to find a solution.
+    Solve the row player's linear program for the payoff matrix with HiGHS.
+    Returns the scipy OptimizeResult. Raises ValueError if the solver fails.
     '''
-    if player == 1:
-        payoffs = -payoffs.T
     # decision vector is [[x], [v]] where x is a column vector of p1 frequencies 
     # and v is the game value
     # objective function is to maximize the game value v
@@ -28,7 +16,7 @@ def solve_normal_zero_sum(payoffs, player=0):
     # constraint of the form A^Tx >= v
     # rearranges into A_ub [[x], [v]] <= 0
     # A_ub is the block matrix [-A^T, 1]
-    A_ub = np.concat([-payoffs.T, np.ones((payoffs.shape[0], 1))], axis=1)
+    A_ub = np.concat([-payoffs.T, np.ones((payoffs.shape[1], 1))], axis=1)
     b_ub = np.zeros(payoffs.shape[1])
 
     # constraint on probabilities sum to 1
@@ -38,11 +26,177 @@ def solve_normal_zero_sum(payoffs, player=0):
     # bounds on x_i >= 0
     bounds = [(0, None) for _ in range(payoffs.shape[0])] + [(None, None)]
 
-    res = linprog(c=c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds)
+    res = linprog(c=c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs")
 
-    if res.success:
-        return res.x[:-1], res.x[-1]
-    else:
+    if not res.success:
         print("ERROR IN LINEAR PROGRAMMING")
         print(res)
-        raise ValueError("Linear programming failed to find a solution.")
\ No newline at end of file
+        raise ValueError("Linear programming failed to find a solution.")
+    return res
+
+def solve_normal_zero_sum(payoffs, player=0):
+    '''
+    Solves a normal-form zero-sum game using linear programming.
+    Parameters:
+    payoffs (numpy.ndarray): A 2D array representing the payoff matrix for player 1. 
+                             The rows correspond to player 1's strategies, and the columns 
+                             correspond to player 2's strategies.
+    player: 0 for row chooser, 1 for column chooser.
+    Returns:
+    tuple: A tuple containing:
+        - numpy.ndarray: The optimal mixed strategy for player 1.
+        - float: The value of the game.
+    Raises:
+    ValueError: If the linear programming solver fails to find a solution.
+    '''
+    if player == 1:
+        payoffs = -payoffs.T
+    res = _solve_row_player_lp(payoffs)
+    return res.x[:-1], res.x[-1]
+
+def solve_normal_zero_sum_primal_dual(payoffs, tol=1e-7):
+    '''
+    Solves a normal-form zero-sum game for both players with a single linear program.
+    The row player's strategy is the primal solution, and the column player's strategy is read off the
+    dual values (HiGHS marginals) of the constraints A^Tx >= v, so the LP is only solved once.
+    Parameters:
+    payoffs (numpy.ndarray): A 2D array representing the payoff matrix for player 1. 
+                             The rows correspond to player 1's strategies, and the columns 
+                             correspond to player 2's strategies.
+    tol: tolerance for the cross-check that both strategies guarantee the same game value.
+    Returns:
+    tuple: A tuple containing:
+        - numpy.ndarray: The optimal mixed strategy for player 1 (rows).
+        - numpy.ndarray: The optimal mixed strategy for player 2 (columns).
+        - float: The value of the game for player 1.
+    Raises:
+    ValueError: If the linear programming solver fails, or if the primal and dual values disagree.
+    '''
+    res = _solve_row_player_lp(payoffs)
+    row_strategy, value = res.x[:-1], res.x[-1]
+
+    # the marginals are the sensitivities of -v to each column constraint, so the column
+    # player's frequencies are their negation. Clean up solver noise before normalizing.
+    col_strategy = np.maximum(-res.ineqlin.marginals, 0)
+    col_strategy = col_strategy / col_strategy.sum()
+
+    # cross-check: the best row against the column strategy must not beat the game value
+    dual_value = np.max(payoffs @ col_strategy)
+    if abs(dual_value - value) > tol:
+        raise ValueError(f"Primal value {value} and dual value {dual_value} disagree.")
+    return row_strategy, col_strategy, value
+
+def _dominated_rows(payoffs, weak=False, tol=1e-9, chunk_size=2**22):
+    '''
+    Return a boolean mask of the rows of payoffs that are dominated by another single row, for a maximizing row player.
+    Strict: some other row is better by more than tol in every column.
+    Weak: some other row is at least as good in every column and better in at least one. 
+          Rows equal to an earlier row (within tol) are also marked, so that only the first copy is kept.
+    The comparisons are vectorized over blocks of rows to bound memory.
+    '''
+    n, m = payoffs.shape
+    dominated = np.zeros(n, dtype=bool)
+    block = max(1, chunk_size // max(1, n * m))
+    for start in range(0, n, block):
+        # diffs[i, k, j] = payoffs[k, j] - payoffs[start + i, j]
+        diffs = payoffs[None, :, :] - payoffs[start:start + block, None, :]
+        if weak:
+            at_least = np.all(diffs >= -tol, axis=2)
+            better_somewhere = np.any(diffs > tol, axis=2)
+            equal = at_least & ~better_somewhere
+            earlier = np.arange(n)[None, :] < np.arange(start, start + diffs.shape[0])[:, None]
+            dominated[start:start + block] = np.any(at_least & better_somewhere, axis=1) | np.any(equal & earlier, axis=1)
+        else:
+            dominated[start:start + block] = np.any(np.all(diffs > tol, axis=2), axis=1)
+    return dominated
+
+def _dominated_rows_mixed(payoffs, tol=1e-9):
+    '''
+    Return a boolean mask of the rows of payoffs that are strictly dominated by a mixture of the other rows.
+    For each row i solve the small LP: maximize eps s.t. sum_k p_k A[k, j] >= A[i, j] + eps for all j, p in the simplex.
+    '''
+    n, m = payoffs.shape
+    dominated = np.zeros(n, dtype=bool)
+    for i in range(n):
+        # compare against the rows not yet eliminated, so two rows can't eliminate each other
+        others = np.flatnonzero(~dominated)
+        others = others[others != i]
+        if len(others) == 0:
+            continue
+        # decision vector is [[p], [eps]], minimize -eps
+        c = np.zeros(len(others) + 1)
+        c[-1] = -1
+        A_ub = np.concat([-payoffs[others].T, np.ones((m, 1))], axis=1)
+        b_ub = -payoffs[i]
+        A_eq = np.concat([np.ones((1, len(others))), np.zeros((1, 1))], axis=1)
+        bounds = [(0, None) for _ in range(len(others))] + [(None, None)]
+        res = linprog(c=c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=np.array([1]), bounds=bounds, method="highs")
+        dominated[i] = res.success and -res.fun > tol
+    return dominated
+
+def eliminate_dominated(payoffs, weak=False, mixed=False, tol=1e-9):
+    '''
+    Iteratively remove dominated rows and columns from a zero-sum payoff matrix for player 1.
+    Strict dominance never removes an equilibrium strategy. Weak dominance (and dropping duplicate strategies)
+    preserves the value and at least one equilibrium, but can remove others.
+    Parameters:
+    payoffs (numpy.ndarray): A 2D array representing the payoff matrix for player 1.
+    weak: also remove weakly dominated and duplicate strategies.
+    mixed: also remove strategies strictly dominated by a mixture of the others (one small LP per strategy).
+    tol: tolerance for payoff comparisons.
+    Returns:
+    tuple: A tuple containing:
+        - numpy.ndarray: The reduced payoff matrix.
+        - numpy.ndarray: The indices of the remaining rows in the original matrix.
+        - numpy.ndarray: The indices of the remaining columns in the original matrix.
+    '''
+    rows = np.arange(payoffs.shape[0])
+    cols = np.arange(payoffs.shape[1])
+    while True:
+        reduced = payoffs[np.ix_(rows, cols)]
+        dominated_rows = _dominated_rows(reduced, weak=weak, tol=tol)
+        rows = rows[~dominated_rows]
+        reduced = payoffs[np.ix_(rows, cols)]
+        # the column player minimizes, so compare columns of the negated matrix
+        dominated_cols = _dominated_rows(-reduced.T, weak=weak, tol=tol)
+        cols = cols[~dominated_cols]
+        changed = dominated_rows.any() or dominated_cols.any()
+
+        if not changed and mixed:
+            reduced = payoffs[np.ix_(rows, cols)]
+            dominated_rows = _dominated_rows_mixed(reduced, tol=tol)
+            rows = rows[~dominated_rows]
+            reduced = payoffs[np.ix_(rows, cols)]
+            dominated_cols = _dominated_rows_mixed(-reduced.T, tol=tol)
+            cols = cols[~dominated_cols]
+            changed = dominated_rows.any() or dominated_cols.any()
+        if not changed:
+            return payoffs[np.ix_(rows, cols)], rows, cols
+
+def expand_strategy(frequencies, indices, size):
+    '''
+    Re-expand the frequencies of a reduced game's strategies to the original strategy set.
+    indices are the positions of the reduced strategies in the original set (as returned by eliminate_dominated).
+    Eliminated strategies get frequency 0.
+    '''
+    expanded = np.zeros(size)
+    expanded[indices] = frequencies
+    return expanded
+
+def solve_normal_zero_sum_reduced(payoffs, weak=False, mixed=False, tol=1e-9):
+    '''
+    Solves a normal-form zero-sum game after eliminating dominated strategies, for both players.
+    See eliminate_dominated for the meaning of weak, mixed and tol.
+    Returns:
+    tuple: A tuple containing:
+        - numpy.ndarray: The optimal mixed strategy for player 1, indexed like the rows of payoffs.
+        - numpy.ndarray: The optimal mixed strategy for player 2, indexed like the columns of payoffs.
+        - float: The value of the game for player 1.
+    '''
+    reduced, rows, cols = eliminate_dominated(payoffs, weak=weak, mixed=mixed, tol=tol)
+    row_strategy, col_strategy, value = solve_normal_zero_sum_primal_dual(reduced)
+    return (
+        expand_strategy(row_strategy, rows, payoffs.shape[0]),
+        expand_strategy(col_strategy, cols, payoffs.shape[1]),
+        value,
+    )
@@ -1,37 +1,163 @@
 import numpy as np
+import os
+import ast
+from scipy import sparse
+from collections.abc import Mapping, MutableMapping
 from typing import TYPE_CHECKING
+from game_utils.InfoSet import InfoSet
 
 if TYPE_CHECKING:
     from game_utils.ZeroSumGame import ZeroSumGame
 
 
-class MixedStrategy(dict):
+def _read_only(array):
+    """ Return a view of array that cannot be written to. """
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class InfoSetIndex:
     """
-    a dict mapping InfoSets to arrays of action frequencies.
+    An ordered list of InfoSets, the row of each one, and the number of actions available at each.
+    Strategies over the same info sets share one index, so arithmetic between them needs no realignment.
     """
+    def __init__(self, info_sets, num_actions):
+        self.info_sets = list(info_sets)
+        self.rows = {I: i for i, I in enumerate(self.info_sets)}
+        self.num_actions = np.array(num_actions, dtype=int).reshape(len(self.info_sets))
+        self.max_actions = int(self.num_actions.max(initial=0))
+        # mask[i, a] is True when a is a legal action index at info set i
+        self.mask = np.arange(self.max_actions)[None, :] < self.num_actions[:, None]
+
+    def __len__(self):
+        return len(self.info_sets)
+
+    def rows_of(self, info_sets):
+        """ Return the rows of the given info sets as an integer array. """
+        return np.fromiter((self.rows[I] for I in info_sets), dtype=int, count=len(info_sets))
+
+
+class MixedStrategy(MutableMapping):
+    """
+    a mapping from InfoSets to arrays of action frequencies.
+    The frequencies are stored in one (n_info_sets, max_actions) matrix, zero-padded past the number of actions
+    at each info set, so that arithmetic on whole strategies is a single numpy operation.
+    """
+    _index_cache = {}  # (game, player) -> InfoSetIndex, shared by all strategies built with empty()
+    _incidence_cache = {}  # (game, player) -> sparse pure strategy to action incidence matrix
+
     @classmethod
     def empty(cls, game: "ZeroSumGame", player):
         '''
         strategy with 0 probability of doing anything at any info set (not actually valid)
         '''
-        strat = cls({}, game)
-        infoSets = game.all_info_sets(player)
-        for I in infoSets:
-            actions = game.get_actions_at_info_set(I)
-            strat[I] = np.zeros(len(actions))
+        key = (game, player)
+        if key not in cls._index_cache:
+            infoSets = game.all_info_sets(player)
+            cls._index_cache[key] = InfoSetIndex(infoSets, [len(game.get_actions_at_info_set(I)) for I in infoSets])
+        index = cls._index_cache[key]
+        return cls._from_arrays(index, np.zeros((len(index), index.max_actions)), game)
+
+    @classmethod
+    def _from_arrays(cls, index: InfoSetIndex, frequencies: np.ndarray, game: "ZeroSumGame"):
+        strat = cls.__new__(cls)
+        strat.index = index
+        strat.frequencies = frequencies
+        strat.game = game
         return strat
+
+    @property
+    def frequencies(self):
+        """ The (n_info_sets, max_actions) frequency matrix, as a read-only view.
+        Write through item assignment or by assigning a new matrix, so the sampling table is rebuilt. """
+        return _read_only(self._frequencies)
+
+    @frequencies.setter
+    def frequencies(self, frequencies):
+        self._frequencies = frequencies
+        self._cumulative = None  # sampling table, rebuilt lazily
         
+    @classmethod
+    def _normal_form_incidence(cls, game: "ZeroSumGame", player):
+        '''
+        Sparse (n_pure_strategies, n_info_sets * max_actions) matrix with a 1 wherever a pure strategy plays an action,
+        with pure strategies in the order of game.pure_strategies(player) and columns matching the flattened
+        frequency matrix of MixedStrategy.empty(game, player). Built once per game and player.
+        '''
+        key = (game, player)
+        if key not in cls._incidence_cache:
+            index = cls.empty(game, player).index
+            n_pure = int(np.prod(index.num_actions))
+            # pure_strategies enumerates the product of actions with the last info set varying fastest, i.e. C order
+            actions = np.stack(np.unravel_index(np.arange(n_pure), index.num_actions), axis=1)
+            slots = actions + np.arange(len(index)) * index.max_actions
+            rows = np.repeat(np.arange(n_pure), len(index))
+            cls._incidence_cache[key] = sparse.csr_matrix(
+                (np.ones(rows.size), (rows, slots.ravel())), shape=(n_pure, len(index) * index.max_actions)
+            )
+        return cls._incidence_cache[key]
+
     @classmethod
     def from_normal_form(cls, frequencies: np.array, player, game: "ZeroSumGame"):
         '''
         normal_frequencies: a list of the frequencies of each strategy, indexed by the list of strategies from game.pure_strategies()
         '''
-        strategies = game.pure_strategies(player)
+        return cls.from_normal_form_batch(np.asarray(frequencies)[None, :], player, game)[0]
+
+    @classmethod
+    def from_normal_form_batch(cls, frequencies: np.array, player, game: "ZeroSumGame"):
+        '''
+        frequencies: a (batch_size, n_pure_strategies) array, each row indexed like from_normal_form.
+        Returns a list of batch_size MixedStrategies sharing one index, computed with a single sparse product.
+        '''
+        index = cls.empty(game, player).index
+        incidence = cls._normal_form_incidence(game, player)
+        flat = np.asarray(incidence.T @ np.asarray(frequencies, dtype=float).T).T
+        flat = flat.reshape(len(flat), len(index), index.max_actions)
+        return [cls._from_arrays(index, frequencies, game) for frequencies in flat]
+
+    @classmethod
+    def from_pure_strategies(cls, strategies, frequencies: np.array, player, game: "ZeroSumGame"):
+        '''
+        The behavioural strategy that is realization-equivalent to playing strategies[i] with probability frequencies[i].
+        At each reachable info set, the action frequencies are those of the pure strategies that play to reach it.
+        Info sets that no pure strategy in the mixture reaches get the plain average of the mixture.
+        '''
+        support = [(s, f) for s, f in zip(strategies, frequencies) if f > 0]
         mixed_strategy = MixedStrategy.empty(game, player)
-        for i, freq in enumerate(frequencies):
-            mixed_strategy += strategies[i].to_mixed() * freq
+        for s, f in support:
+            mixed_strategy += s.to_mixed() * f
+
+        visited = set()
+        def walk(state, consistent):
+            # consistent: indices into support of the pure strategies which play to reach this state
+            if state.is_terminal():
+                return
+            actions = state.get_actions()
+            if state.current_player() != player:
+                for action in actions:
+                    walk(state.get_next_state(action), consistent)
+                return
+            info_set = state.current_info_set()
+            if info_set not in visited:
+                visited.add(info_set)
+                freqs = np.zeros(len(actions))
+                for k in consistent:
+                    freqs[actions.index(support[k][0][info_set])] += support[k][1]
+                mixed_strategy[info_set] = freqs
+            for action in actions:
+                next_consistent = [k for k in consistent if support[k][0][info_set] == action]
+                if next_consistent:
+                    walk(state.get_next_state(action), next_consistent)
+
+        for p1, p2, nature in game.type_combos():
+            walk(game(p1_type=p1, p2_type=p2, nature_type=nature, history=""), list(range(len(support))))
+
+        totals = mixed_strategy.frequencies.sum(axis=1, keepdims=True)
+        mixed_strategy.frequencies = mixed_strategy.frequencies / np.where(totals > 0, totals, 1)
         return mixed_strategy
-        
+
     def __init__(self, mapping: dict, game: "ZeroSumGame"):
         """
         Initialize the Strategy object.
@@ -39,38 +165,229 @@ class MixedStrategy(dict):
             mapping (dict): A dictionary mapping InfoSets to np arrays of frequencies over actions.
             game (ZeroSumGame): An instance of the ZeroSumGame class representing the game.
         """
-        super().__init__(mapping)
-        self.game=game
+        mapping = dict(mapping)
+        self.index = InfoSetIndex(mapping.keys(), [len(freqs) for freqs in mapping.values()])
+        self.frequencies = np.zeros((len(self.index), self.index.max_actions))
+        for i, freqs in enumerate(mapping.values()):
+            self._frequencies[i, :len(freqs)] = freqs
+        self.game = game
+
+    def __getitem__(self, infoSet):
+        """ Return the frequencies at infoSet, as a read-only view into the frequency matrix. Assign to strategy[infoSet] to change them. """
+        row = self.index.rows[infoSet]
+        return _read_only(self._frequencies[row, :self.index.num_actions[row]])
+
+    def __setitem__(self, infoSet, freqs):
+        row = self.index.rows.get(infoSet)
+        if row is not None:
+            if len(freqs) != self.index.num_actions[row]:
+                raise ValueError(f"Expected {self.index.num_actions[row]} frequencies at {infoSet}, got {len(freqs)}")
+            self._frequencies[row, :len(freqs)] = freqs
+            self._cumulative = None
+            return
+        # new info sets need a new index, since the old one may be shared. Prefer building from a mapping.
+        self._reindex(self.index.info_sets + [infoSet], np.append(self.index.num_actions, len(freqs)))
+        self._frequencies[-1, :len(freqs)] = freqs
+
+    def __delitem__(self, infoSet):
+        row = self.index.rows[infoSet]
+        keep = np.arange(len(self.index)) != row
+        info_sets = [I for I in self.index.info_sets if I != infoSet]
+        frequencies = self.frequencies[keep]
+        self.index = InfoSetIndex(info_sets, self.index.num_actions[keep])
+        self.frequencies = frequencies[:, :self.index.max_actions]
+
+    def _reindex(self, info_sets, num_actions):
+        """ Replace the index with a new one, keeping the frequencies of existing info sets. """
+        old_frequencies = self.frequencies
+        self.index = InfoSetIndex(info_sets, num_actions)
+        self.frequencies = np.zeros((len(self.index), self.index.max_actions))
+        self._frequencies[:old_frequencies.shape[0], :old_frequencies.shape[1]] = old_frequencies
+
+    def __iter__(self):
+        return iter(self.index.info_sets)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, infoSet):
+        return infoSet in self.index.rows
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping) or self.keys() != other.keys():
+            return False
+        return all(np.array_equal(self[I], other[I]) for I in self)
+
+    __hash__ = None
+
+    def copy(self):
+        return MixedStrategy._from_arrays(self.index, self.frequencies.copy(), self.game)
+
+    def _aligned(self, other):
+        """ Return the frequency matrix of other, with rows in the order of self's index. """
+        if isinstance(other, MixedStrategy) and other.index is self.index:
+            return other.frequencies
+        assert self.keys() == other.keys()
+        if not isinstance(other, MixedStrategy):
+            other = MixedStrategy(other, self.game)
+        other_frequencies = other.frequencies[other.index.rows_of(self.index.info_sets)]
+        assert np.array_equal(other.index.num_actions[other.index.rows_of(self.index.info_sets)], self.index.num_actions)
+        return other_frequencies
     
-    def sample(self, infoSet):
+    def info_set_ids(self, info_sets):
+        """
+        Return the integer ids (rows) of the given info sets, for use with sample_many.
+        """
+        return self.index.rows_of(info_sets)
+
+    def _cumulative_table(self):
+        """
+        Return the (n_info_sets, max_actions) table of cumulative action frequencies, normalized per info set.
+        Padding past the legal actions is inf so it is never sampled. Built once, and rebuilt after the strategy changes.
+        Every write goes through __setitem__ or the frequencies setter (reads return read-only views), which reset it.
+        """
+        if self._cumulative is None:
+            frequencies = self.normalize().frequencies
+            cumulative = np.cumsum(frequencies, axis=1)
+            # guard against rounding: the last legal action always absorbs the remaining mass
+            last = np.maximum(self.index.num_actions - 1, 0)
+            cumulative[np.arange(len(self.index)), last] = 1.0
+            self._cumulative = np.where(self.index.mask, cumulative, np.inf)
+        return self._cumulative
+
+    def sample(self, infoSet, rng=None):
         """
         Return a randomly chosen action based on the frequencies.
+        rng: a np.random.Generator. Defaults to the global numpy random state.
         """
-        freqs = self[infoSet]
-        actions = self.game.get_actions_at_info_set(infoSet)
-        return np.random.choice(actions, p=freqs)
+        rng = np.random if rng is None else rng
+        row = self.index.rows[infoSet]
+        action = int(np.searchsorted(self._cumulative_table()[row], rng.random(), side="right"))
+        return self.game.get_actions_at_info_set(infoSet)[action]
+
+    def sample_many(self, infoset_ids, rng=None):
+        """
+        Sample one action for each info set id (as returned by info_set_ids), for a whole batch at once.
+        infoset_ids: integer array of any shape.
+        rng: a np.random.Generator. Defaults to the global numpy random state.
+        Returns an integer array of the same shape, holding the index of the chosen action at each info set.
+        """
+        rng = np.random if rng is None else rng
+        infoset_ids = np.asarray(infoset_ids)
+        u = rng.random(infoset_ids.shape)
+        return np.sum(u[..., None] >= self._cumulative_table()[infoset_ids], axis=-1)
 
     def __add__(self, other):
         """
         for each key, the item should be a numpy array of the same size.
         array sum each item.
         """
-        assert self.keys() == other.keys()
-        out = MixedStrategy(self.copy(), self.game)
-        for I in self:
-            freqs1 = self[I]
-            freqs2 = other[I]
-            assert freqs1.shape == freqs2.shape
-            out[I] = freqs1 + freqs2
-        return out
+        return MixedStrategy._from_arrays(self.index, self.frequencies + self._aligned(other), self.game)
 
     def __mul__(self, scalar):
-        out = MixedStrategy(self.copy(), self.game)
-        for I in self:
-            freqs1 = self[I]
-            out[I] = freqs1 * scalar
-        return out
-    
+        return MixedStrategy._from_arrays(self.index, self.frequencies * scalar, self.game)
+
+    __rmul__ = __mul__
+
+    def __or__(self, other):
+        """
+        union of two strategies (e.g. one for each player), like dict union. other wins on shared keys.
+        """
+        mapping = dict(self.items())
+        mapping.update(other.items())
+        return MixedStrategy(mapping, self.game)
+
+    def normalize(self):
+        """
+        Return a copy where the frequencies at each info set sum to 1. Info sets with all zero frequencies become uniform.
+        """
+        totals = self.frequencies.sum(axis=1, keepdims=True)
+        uniform = self.index.mask / np.maximum(self.index.num_actions[:, None], 1)
+        frequencies = np.where(totals > 0, self.frequencies / np.where(totals > 0, totals, 1), uniform)
+        return MixedStrategy._from_arrays(self.index, frequencies, self.game)
+
+    def blend(self, other, weight):
+        """
+        Return (1 - weight) * self + weight * other.
+        """
+        return MixedStrategy._from_arrays(self.index, (1 - weight) * self.frequencies + weight * self._aligned(other), self.game)
+
+    def distance(self, other, ord=1):
+        """
+        Return the largest ord-norm distance between the action frequencies of self and other at any info set.
+        """
+        return np.linalg.norm(self.frequencies - self._aligned(other), ord=ord, axis=1).max(initial=0)
+
+    def save(self, path):
+        """
+        Save the strategy in the binary format read by MappedStrategy: a directory holding
+        keys.npy (sorted info set keys), offsets.npy (CSR-style action offsets) and frequencies.npy.
+        """
+        keys = np.array([MappedStrategy.key(I) for I in self.index.info_sets], dtype=str)
+        order = np.argsort(keys, kind="stable")
+        num_actions = self.index.num_actions[order]
+        offsets = np.concat([[0], np.cumsum(num_actions)]).astype(np.int64)
+        frequencies = self.frequencies[order][self.index.mask[order]]
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "keys.npy"), keys[order])
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "frequencies.npy"), frequencies.astype(np.float64))
+
+
+class MappedStrategy(Mapping):
+    """
+    A read-only strategy backed by memory-mapped files written by MixedStrategy.save.
+    Opening takes constant time, lookups are a binary search over the sorted keys, and the returned
+    frequency arrays are views into the shared mapped file, so many processes can read one strategy without copies.
+    """
+    def __init__(self, path, game: "ZeroSumGame" = None):
+        self.path = path
+        self.game = game
+        self.keys_table = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.frequencies = np.load(os.path.join(path, "frequencies.npy"), mmap_mode="r")
+
+    @staticmethod
+    def key(infoSet):
+        """ The string an InfoSet is stored under. Numpy scalars (e.g. card types from permutations) are stored
+        as the equal Python scalars, so that the keys can be parsed back with ast.literal_eval. """
+        as_python = lambda value: value.item() if isinstance(value, np.generic) else value
+        return repr((as_python(infoSet.type), as_python(infoSet.history)))
+
+    def _row(self, infoSet):
+        key = self.key(infoSet)
+        row = int(np.searchsorted(self.keys_table, key))
+        if row < len(self.keys_table) and self.keys_table[row] == key:
+            return row
+        raise KeyError(infoSet)
+
+    def __getitem__(self, infoSet):
+        row = self._row(infoSet)
+        return self.frequencies[self.offsets[row]:self.offsets[row + 1]]
+
+    def __contains__(self, infoSet):
+        try:
+            self._row(infoSet)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for key in self.keys_table:
+            yield InfoSet(*ast.literal_eval(str(key)))
+
+    def __len__(self):
+        return len(self.keys_table)
+
+    def to_mixed(self):
+        """ Load the whole strategy into memory as a MixedStrategy. """
+        return MixedStrategy({I: np.array(self[I]) for I in self}, self.game)
+
+
 class PureStrategy(dict):
     def __init__(self, mapping: dict, game: "ZeroSumGame"):
         """
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List
 import numpy as np
 from itertools import product
+from functools import lru_cache
 from game_utils.InfoSet import InfoSet
 from game_utils.Strategy import PureStrategy, MixedStrategy
 
@@ -20,8 +21,9 @@ class ZeroSumGame(ABC):
         return cls(p1_type=p1_type, p2_type=p2_type, nature_type=nature_type, history="")
     
     @classmethod
+    @lru_cache(maxsize=None)
     def pure_strategies(cls, player):
-        """Return a list of possible strategies for a given player."""
+        """Return a tuple of possible strategies for a given player. Computed once per class, so do not modify the strategies."""
         info_sets = cls.all_info_sets(player)
         possible_actions_at_info_sets = []
         for i, I in enumerate(info_sets):
@@ -33,33 +35,35 @@ class ZeroSumGame(ABC):
         for actions in strategy_actions:
             strat = PureStrategy({I: actions[i] for i, I in enumerate(info_sets)}, cls)
             strategies.append(strat)
-        return strategies
+        return tuple(strategies)
     
     @classmethod
     def expected_payoff_exact(cls, strategy1: PureStrategy, strategy2: PureStrategy):
         """
-        TODO: accommodate for nature's type and randomness.
+        Return the expected payoff for player 0 when both players play pure strategies,
+        averaging over all type combos and every chance outcome of nature.
         """
-        total_payoff = 0
+        def value(state):
+            if state.is_terminal():
+                return state.get_payoff(0)
+            player = state.current_player()
+            if player == 2:
+                return sum(prob * value(state.get_next_state(action)) for action, prob in state.chance_outcomes())
+            strategy = strategy1 if player == 0 else strategy2
+            return value(state.get_next_state(strategy[state.current_info_set()]))
+
         possible_types = cls.type_combos()
+        total_payoff = 0
         for p1, p2, nature in possible_types:
-            state = cls(p1_type=p1, p2_type=p2, nature_type=nature, history="")
-            while not state.is_terminal():
-                info_set = state.current_info_set()
-                if state.current_player() == 0:
-                    action = strategy1[info_set]
-                else:
-                    action = strategy2[info_set]
-                state = state.get_next_state(action)
-            total_payoff += state.get_payoff(0)
+            total_payoff += value(cls(p1_type=p1, p2_type=p2, nature_type=nature, history=""))
         return total_payoff / len(possible_types)
     
     @classmethod
-    def expected_payoff_approx(cls, strategy1: MixedStrategy, strategy2: MixedStrategy, simulations=1000):
+    def expected_payoff_approx(cls, strategy1: MixedStrategy, strategy2: MixedStrategy, simulations=1000, rng=None):
         """
         Approximates the expected payoff for player 0 by simulating many random playthroughs.
         Args:
-            
+            rng: a np.random.Generator used to sample actions. Defaults to the global numpy random state.
         Returns:
             float: The average payoff for player 0 over many random playthroughs.
         """
@@ -69,13 +73,96 @@ class ZeroSumGame(ABC):
             while not state.is_terminal():
                 info_set = state.current_info_set()
                 if state.current_player() == 0:
-                    action = strategy1.sample(info_set)
+                    action = strategy1.sample(info_set, rng)
                 else:
-                    action = strategy2.sample(info_set)
+                    action = strategy2.sample(info_set, rng)
                 state = state.get_next_state(action)
             total_payoff += state.get_payoff(0)
         return total_payoff / simulations
     
+    @classmethod
+    def best_response(cls, strategy: MixedStrategy, player):
+        """
+        Compute a best response pure strategy for player against the opponent's strategy,
+        by walking the game tree directly (the normal form is never built).
+        Args:
+            strategy: the MixedStrategy of the opponent (1 - player).
+            player: the player who is best responding.
+        Returns:
+            tuple: A tuple containing:
+                - PureStrategy: a best response for player, defined at every info set of player.
+                - float: the expected payoff for player when playing it against strategy.
+        """
+        # group the states where player acts by info set, weighted by chance and opponent reach
+        info_set_states = {}
+        info_set_depths = {}
+        def collect(state, weight, depth):
+            if state.is_terminal():
+                return
+            actions = state.get_actions()
+            if state.current_player() == 2:
+                for action, prob in state.chance_outcomes():
+                    collect(state.get_next_state(action), weight * prob, depth + 1)
+            elif state.current_player() == player:
+                info_set = state.current_info_set()
+                info_set_states.setdefault(info_set, []).append((state, weight))
+                info_set_depths[info_set] = max(depth, info_set_depths.get(info_set, 0))
+                for action in actions:
+                    collect(state.get_next_state(action), weight, depth + 1)
+            else:
+                freqs = strategy[state.current_info_set()]
+                for action, freq in zip(actions, freqs):
+                    if freq > 0:
+                        collect(state.get_next_state(action), weight * freq, depth + 1)
+
+        type_combos = cls.type_combos()
+        roots = [cls(p1_type=p1, p2_type=p2, nature_type=nature, history="") for p1, p2, nature in type_combos]
+        for root in roots:
+            collect(root, 1 / len(type_combos), 0)
+
+        # decide the deepest info sets first, so every choice below an info set is already fixed
+        choices = {}
+        values = {}
+        def value(state):
+            if state.is_terminal():
+                return state.get_payoff(player)
+            key = (state.p1_type, state.p2_type, state.nature_type, state.history)
+            if key not in values:
+                actions = state.get_actions()
+                if state.current_player() == 2:
+                    values[key] = sum(prob * value(state.get_next_state(action)) for action, prob in state.chance_outcomes())
+                elif state.current_player() == player:
+                    values[key] = value(state.get_next_state(choices[state.current_info_set()]))
+                else:
+                    freqs = strategy[state.current_info_set()]
+                    values[key] = sum(freq * value(state.get_next_state(action)) for action, freq in zip(actions, freqs) if freq > 0)
+            return values[key]
+
+        for info_set in sorted(info_set_states, key=lambda I: info_set_depths[I], reverse=True):
+            actions = cls.get_actions_at_info_set(info_set)
+            action_values = [
+                sum(weight * value(state.get_next_state(action)) for state, weight in info_set_states[info_set])
+                for action in actions
+            ]
+            choices[info_set] = actions[int(np.argmax(action_values))]
+
+        # info sets that are never reached get an arbitrary action
+        best_response = PureStrategy({
+            I: choices.get(I, cls.get_actions_at_info_set(I)[0]) for I in cls.all_info_sets(player)
+        }, cls)
+        best_response_value = sum(value(root) for root in roots) / len(roots)
+        return best_response, best_response_value
+
+    @classmethod
+    def exploitability(cls, strategy1: MixedStrategy, strategy2: MixedStrategy):
+        """
+        Return the average amount a best responder gains against the strategy profile.
+        This is 0 exactly when (strategy1, strategy2) is a Nash equilibrium.
+        """
+        _, value1 = cls.best_response(strategy2, 0)
+        _, value2 = cls.best_response(strategy1, 1)
+        return (value1 + value2) / 2
+
     @classmethod
     def convert_to_normal(cls):
         """
@@ -110,6 +197,8 @@ class ZeroSumGame(ABC):
         Do not implement in subclass. Instead, implement _get_actions_at_info_set."""
         if self.is_terminal():
             return []
+        if self.current_player() == 2:
+            return [action for action, _ in self.chance_outcomes()]
         info_set = self.current_info_set()
         return self.get_actions_at_info_set(info_set)
     
@@ -124,19 +213,33 @@ class ZeroSumGame(ABC):
         if self.is_terminal():
             raise ValueError("Game has already ended.")
         new_state = self.copy()
-        new_state.history += action
+        new_state._apply_action(action)
         
         while new_state.current_player() == 2:
-            # nature's turn
+            # nature's turn. Resolve it here only if nature's type determines the action,
+            # otherwise stop at the chance node so the caller can branch over chance_outcomes().
             if new_state.is_terminal():
                 break
-            new_state.history += self.get_nature_action()
+            outcomes = new_state.chance_outcomes()
+            if len(outcomes) != 1:
+                break
+            new_state._apply_action(outcomes[0][0])
         return new_state
+
+    def _apply_action(self, action: str):
+        """Append action to the history in place. Subclasses that keep incremental state about the history
+        override this to update it along with the history."""
+        self.history += action
     
     def get_nature_action(self) -> str:
         """Return the nature action for the current state. By default, raise an Error."""
         raise NotImplementedError("Nature action not implemented.")
 
+    def chance_outcomes(self):
+        """Return a list of (action, probability) pairs for nature at the current state.
+        By default nature is deterministic given its type, and plays get_nature_action()."""
+        return [(self.get_nature_action(), 1.0)]
+
     def get_payoff(self, player: int) -> int:
         """Return the payoff for a given player at a terminal state. Raise error if game is not over.
         Do not implement in subclass. Instead, implement _do_get_payoff."""
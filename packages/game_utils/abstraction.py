@@ -0,0 +1,114 @@
+import numpy as np
+import time
+from functools import lru_cache
+from game_utils.CFR import CFRSolver
+from game_utils.InfoSet import InfoSet
+from game_utils.Strategy import MixedStrategy
+from game_utils.ZeroSumGame import ZeroSumGame
+
+
+BUCKET_METHODS = ("equal_width", "equity")
+
+
+def bucket_cards(game_class: ZeroSumGame, n_buckets, method="equal_width"):
+    """
+    Return an array mapping each card of an n card game (Kuhn.nCard(n) or a subclass) to a bucket in range(n_buckets).
+    Args:
+        method:
+            - "equal_width": consecutive runs of n // n_buckets cards share a bucket (the last bucket takes the remainder).
+            - "equity": cards are bucketed by their showdown equity against a uniformly random opponent card,
+              in n_buckets equal-width equity intervals.
+    """
+    n = game_class.n
+    n_buckets = min(n_buckets, n)
+    if method == "equal_width":
+        bucket_size = max(1, n // n_buckets)
+        return np.minimum(np.arange(n) // bucket_size, n_buckets - 1)
+    if method == "equity":
+        # fraction of the other cards that each card beats at showdown
+        equity = (game_class.showdown_signs() > 0).sum(axis=1) / (n - 1)
+        return np.minimum((equity * n_buckets).astype(int), n_buckets - 1)
+    raise ValueError(f"Unknown bucketing method {method}, expected one of {BUCKET_METHODS}")
+
+
+@lru_cache(maxsize=None)
+def abstract_game(game_class: ZeroSumGame, n_buckets, method="equal_width"):
+    """
+    Return a subclass of game_class in which each player only observes the bucket of their card.
+    Deals and payoffs are those of game_class; the info set types are buckets instead of cards.
+    The subclass is memoized, like Kuhn.nCard.
+    """
+    buckets = bucket_cards(game_class, n_buckets, method)
+
+    class abstractSubclass(game_class):
+        card_buckets = buckets
+
+        @classmethod
+        def card_info_set_types(cls):
+            return cls.card_buckets
+
+        def current_info_set(self):
+            info_set = super().current_info_set()
+            return InfoSet(int(self.card_buckets[info_set.type]), info_set.history)
+
+        @classmethod
+        @lru_cache(maxsize=None)
+        def all_info_sets(cls, player):
+            # the distinct bucketed info sets, in the order the real info sets first map to them
+            real_info_sets = game_class.all_info_sets(player)
+            return tuple(dict.fromkeys(InfoSet(int(cls.card_buckets[I.type]), I.history) for I in real_info_sets))
+
+    abstractSubclass.__name__ = f"{game_class.__name__}[{n_buckets} {method} buckets]"
+    return abstractSubclass
+
+
+def lift_strategy(abstract_strategy: MixedStrategy, player, game_class: ZeroSumGame, buckets):
+    """
+    Return the MixedStrategy of game_class that plays, at every info set in game_class.all_info_sets(player),
+    what abstract_strategy plays at the bucket of its card.
+    """
+    index = MixedStrategy.empty(game_class, player).index
+    abstract_info_sets = [InfoSet(int(buckets[I.type]), I.history) for I in index.info_sets]
+    rows = abstract_strategy.index.rows_of(abstract_info_sets)
+    frequencies = abstract_strategy.frequencies[rows, :index.max_actions].copy()
+    return MixedStrategy._from_arrays(index, frequencies, game_class)
+
+
+class AbstractionSolver:
+    """
+    Approximately solves a large n card game by solving a card abstraction of it with CFR.
+    Cards are grouped into buckets, CFR is run on the game where players only see their bucket,
+    and the abstract strategies are lifted back to every info set of the real game.
+
+    Example usage:
+
+    solver = abstraction.AbstractionSolver(kuhn.Kuhn.nCard(1000), n_buckets=10, method="equity")
+    solver.train(10000)
+    strat1, strat2 = solver.get_strategy(0), solver.get_strategy(1)
+    print(solver.exploitability())
+    """
+    def __init__(self, game_class: ZeroSumGame, n_buckets, method="equal_width"):
+        self.game_class = game_class
+        self.abstract_game_class = abstract_game(game_class, n_buckets, method)
+        self.buckets = self.abstract_game_class.card_buckets
+        self.cfr = CFRSolver(self.abstract_game_class)
+
+    def train(self, iterations, verbose=True):
+        """ Run CFR on the abstract game for the specified number of iterations. """
+        self.cfr.train(iterations, verbose=verbose)
+
+    def get_abstract_strategy(self, player):
+        """ Return the learned strategy of the abstract game, over bucketed info sets. """
+        return self.cfr.get_strategy(player)
+
+    def get_strategy(self, player):
+        """ Return the learned strategy lifted to the real game, as a MixedStrategy over game_class.all_info_sets(player). """
+        return lift_strategy(self.get_abstract_strategy(player), player, self.game_class, self.buckets)
+
+    def exploitability(self, verbose=True):
+        """ Return the exploitability of the lifted strategies in the real game. """
+        start_time = time.time()
+        exploitability = self.game_class.exploitability(self.get_strategy(0), self.get_strategy(1))
+        if verbose:
+            print(f"  Exploitability in {self.game_class.__name__}: {exploitability:.6f} ({time.time() - start_time:.2f}s)")
+        return exploitability
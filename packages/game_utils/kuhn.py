@@ -1,28 +1,63 @@
 import numpy as np
 from game_utils.ZeroSumGame import ZeroSumGame
 from game_utils.InfoSet import InfoSet
+from game_utils.Strategy import PureStrategy, MixedStrategy
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+@dataclass(frozen=True)
+class BettingNode:
+    """
+    One betting history of a Kuhn game, independent of the cards dealt.
+    The payoff for player 1 at a terminal node is fold_payoff + showdown_stake * sign,
+    where sign is +1 if player 1 holds the higher card and -1 otherwise.
+    """
+    player: int
+    actions: tuple
+    terminal: bool
+    pot: int
+    fold_payoff: int
+    showdown_stake: int
 
 
 class Kuhn(ZeroSumGame, ABC):
+    TERMINAL_HISTORIES = ('BC', 'KK', 'BF', 'KBC', 'KBF')
+
     def __init__(self, p1_type, p2_type, history, **kwargs):
         n = self.__class__.n
         assert n > p1_type and n > p2_type and p1_type >= 0 and p2_type >= 0
         super().__init__(p1_type=p1_type, p2_type=p2_type, nature_type=kwargs.get('nature_type', None), history=history)
 
     @classmethod
+    @lru_cache(maxsize=None)
     def nCard(cls, n_cards):
         '''
         Returns a subclass of KuhnState with n_cards as the number of cards in the deck.
+        The subclass is memoized by (cls, n_cards), so repeated calls return the same class
+        and per-class caches (info sets, strategies, betting tables) are shared.
         '''
         class ncardSubclass(cls):
             n = n_cards
         # print(cls)
         # print(ncardSubclass)
         ncardSubclass.__name__ =  f"{cls.__name__}({n_cards})"
+        ncardSubclass.BETTING_TABLE = ncardSubclass.build_betting_table()
         return ncardSubclass
 
     @classmethod
+    def random(cls, rng=None):
+        """ Return a game state with a random deal of two distinct cards, sampled directly instead of from the n(n-1) type_combos. """
+        rng = np.random if rng is None else rng
+        p1_type = int(rng.choice(cls.n))
+        p2_type = int(rng.choice(cls.n - 1))
+        if p2_type >= p1_type:
+            p2_type += 1
+        return cls(p1_type=p1_type, p2_type=p2_type, history="")
+
+    @classmethod
+    @lru_cache(maxsize=None)
     def type_combos(cls):
         # p1, p2 must have distinct cards
         combos = []
@@ -31,11 +66,107 @@ class Kuhn(ZeroSumGame, ABC):
                 if i == j:
                     continue
                 combos.append((i, j, None))
-        return combos
+        return tuple(combos)
         
+    @classmethod
+    def build_betting_table(cls):
+        """
+        Return a dict mapping every reachable betting history to its BettingNode, by walking the histories from "".
+        The betting does not depend on the cards, so nCard builds the table once per class and stores it in BETTING_TABLE,
+        which the per-node methods index directly.
+        """
+        table = {}
+        frontier = [""]
+        while len(frontier) > 0:
+            history = frontier.pop()
+            player = len(history) % 2
+            terminal = history in cls.TERMINAL_HISTORIES
+            # for each call (and implicit bet), the pot increases by 2. pot starts at 2
+            pot = 2 + 2 * history.count("C")
+            fold_payoff, showdown_stake, actions = 0, 0, ()
+            if terminal and history[-1] == "F":
+                # the player to act before the fold is the one who folded
+                folder = (len(history) - 1) % 2
+                fold_payoff = pot // 2 if folder == 1 else -pot // 2
+            elif terminal:
+                showdown_stake = pot // 2
+            elif history == "":
+                actions = ("K", "B")
+            else:
+                actions = ("F", "C") if history[-1] == "B" else ("K", "B")
+            table[history] = BettingNode(player, actions, terminal, pot, fold_payoff, showdown_stake)
+            frontier += [history + action for action in actions]
+        return table
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def showdown_signs(cls):
+        """
+        Return the (n, n) matrix whose entry [i, j] is +1 if player 1 holding card i beats player 2 holding card j, and -1 if they lose.
+        The diagonal (not a valid deal) is 0.
+        """
+        cards = np.arange(cls.n)
+        return np.sign(cards[:, None] - cards[None, :])
+
+    @classmethod
+    def card_info_set_types(cls):
+        """ Return an array giving the info set type of each card. This is the card itself, card abstractions override it. """
+        return np.arange(cls.n)
+
+    @classmethod
+    def best_response(cls, strategy: MixedStrategy, player):
+        """
+        Best response specialized to the Kuhn family, with the same returns as ZeroSumGame.best_response.
+        The betting table is walked once, carrying the opponent's reach probability for every card as a vector.
+        Showdowns only depend on the order of the cards, so the responder's value for every card at a terminal history
+        comes from prefix sums of the opponent's reach, which takes O(n) per history instead of O(n^2) over deals.
+        """
+        n = cls.n
+        types = cls.card_info_set_types()
+        type_ids, card_types = np.unique(types, return_inverse=True)
+        table = cls.BETTING_TABLE
+        sign = 1 if player == 0 else -1
+        choices = {}
+
+        def opponent_frequencies(history, num_actions):
+            """ (n, num_actions) matrix of the opponent's action frequencies at history, for each card """
+            info_sets = [InfoSet(int(t), history) for t in type_ids]
+            if isinstance(strategy, MixedStrategy):
+                frequencies = strategy.frequencies[strategy.index.rows_of(info_sets), :num_actions]
+            else:
+                frequencies = np.array([strategy[I] for I in info_sets])
+            return frequencies[card_types]
+
+        def value(history, reach):
+            """
+            reach[o] is the probability that the opponent holding card o plays to history.
+            Return the vector of the responder's value for each of their cards, summed over the opponent's cards.
+            """
+            node = table[history]
+            if node.terminal:
+                below = np.cumsum(reach) - reach  # opponent reach over lower cards
+                above = reach.sum() - below - reach  # opponent reach over higher cards
+                return sign * node.fold_payoff * (below + above) + node.showdown_stake * (below - above)
+            if node.player == player:
+                action_values = np.array([value(history + action, reach) for action in node.actions])
+                # the responder chooses one action per info set, which may cover several cards
+                type_values = np.array([np.bincount(card_types, weights=v, minlength=len(type_ids)) for v in action_values])
+                best = np.argmax(type_values, axis=0)
+                for t, b in zip(type_ids, best):
+                    choices[InfoSet(int(t), history)] = node.actions[b]
+                return action_values[best[card_types], np.arange(n)]
+            frequencies = opponent_frequencies(history, len(node.actions))
+            return sum(value(history + action, reach * frequencies[:, i]) for i, action in enumerate(node.actions))
+
+        best_response_value = float(value("", np.ones(n)).sum() / (n * (n - 1)))
+        best_response = PureStrategy({
+            I: choices.get(I, cls.get_actions_at_info_set(I)[0]) for I in cls.all_info_sets(player)
+        }, cls)
+        return best_response, best_response_value
+
     def current_player(self):
         """ Return the current player (0 = P1, 1 = P2) """
-        return len(self.history) % 2
+        return self.BETTING_TABLE[self.history].player
 
     def current_info_set(self):
         # each player can see the whole history
@@ -47,11 +178,10 @@ class Kuhn(ZeroSumGame, ABC):
 
     @classmethod
     def get_actions_at_info_set(cls, info_set):
-        if info_set.history == "":
-            return ["K", "B"]
-        return ["F", "C"] if info_set.history[-1] == "B" else ["K", "B"]
+        return list(cls.BETTING_TABLE[info_set.history].actions)
 
     @classmethod
+    @lru_cache(maxsize=None)
     def all_info_sets(cls, player):
         # each player can see the whole history
         info_sets = []
@@ -62,32 +192,24 @@ class Kuhn(ZeroSumGame, ABC):
         for card in range(cls.n):
             for h in histories:
                 info_sets.append(InfoSet(card, h))
-        return info_sets
+        return tuple(info_sets)
 
     def is_terminal(self):
-        return self.history in ['BC', 'KK', 'BF', 'KBC', 'KBF']
+        return self.BETTING_TABLE[self.history].terminal
     
     def get_pot(self):
         """ Return the current pot size, including the ante """
-        # for each call (and implicit bet), the pot increases by 2
-        # pot starts at 2
-        calls = self.history.count("C")
-        return 2 + 2 * calls
+        return self.BETTING_TABLE[self.history].pot
 
     def _do_get_p1_payoff(self):
-        if self.history[-1] == "F": # last player to act folded
-            previous_state = self.copy()
-            previous_state.history = previous_state.history[:-1]
-            folder = previous_state.current_player()
-            p1_payoff = self.get_pot()//2 if folder == 1 else -self.get_pot()//2
-        else:
-            p1_payoff = self.get_pot()//2 if self.p1_type > self.p2_type else -self.get_pot()//2
-        return p1_payoff
+        node = self.BETTING_TABLE[self.history]
+        return node.fold_payoff + node.showdown_stake * (1 if self.p1_type > self.p2_type else -1)
     
 class HalfStreetKuhn(Kuhn):
     # Kuhn poker, but if player 1 checks, we go straight to showdown
 
     @classmethod
+    @lru_cache(maxsize=None)
     def all_info_sets(cls, player):
         # each player can see the whole history
         info_sets = []
@@ -98,10 +220,9 @@ class HalfStreetKuhn(Kuhn):
         for card in range(cls.n):
             for h in histories:
                 info_sets.append(InfoSet(card, h))
-        return info_sets
+        return tuple(info_sets)
 
-    def is_terminal(self):
-        return self.history in ['BC', 'K', 'BF']
+    TERMINAL_HISTORIES = ('BC', 'K', 'BF')
     
 ThreeCard = Kuhn.nCard(3)
 ThreeCardHalfStreet = HalfStreetKuhn.nCard(3)
\ No newline at end of file
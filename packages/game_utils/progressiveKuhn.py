@@ -1,9 +1,12 @@
 import numpy as np
 from game_utils.kuhn import Kuhn
+from game_utils.ZeroSumGame import ZeroSumGame
 from game_utils.InfoSet import InfoSet
 from game_utils import utils
 from abc import ABC, abstractmethod
-from itertools import permutations, product
+from itertools import product
+from functools import lru_cache
+import math
 
 class ProgressiveKuhn(Kuhn, ABC):
     def __init__(self, p1_type, p2_type, nature_type, history, **kwargs):
@@ -12,6 +15,40 @@ class ProgressiveKuhn(Kuhn, ABC):
         self.n = n
         super().__init__(p1_type=p1_type, p2_type=p2_type, nature_type=nature_type, history=history)
 
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        '''
+        Setting the whole history scans it once, to find the reveals. Transitions go through _apply_action instead,
+        which keeps these fields up to date in O(1):
+            _num_reveals: number of cards nature has revealed
+            _last_reveal: index in the history of the last reveal, -1 if there is none
+            _round_history: the history of the current betting round (since the last reveal)
+        '''
+        self._history = history
+        reveal_inds = [i for i, c in enumerate(history) if c.isnumeric()]
+        self._num_reveals = len(reveal_inds)
+        self._last_reveal = reveal_inds[-1] if len(reveal_inds) > 0 else -1
+        self._round_history = history[self._last_reveal + 1:]
+
+    def _apply_action(self, action):
+        self._history += action
+        if action.isnumeric():
+            self._num_reveals += 1
+            self._last_reveal = len(self._history) - 1
+            self._round_history = ""
+        else:
+            self._round_history += action
+
+    def copy(self):
+        """ Return a copy of the game state, including the incremental fields, without rescanning the history. """
+        new_state = self.__class__.__new__(self.__class__)
+        new_state.__dict__.update(self.__dict__)
+        return new_state
+
     @classmethod
     def hist_since_nature_action(cls, history):
         '''
@@ -23,64 +60,142 @@ class ProgressiveKuhn(Kuhn, ABC):
         return history[nature_actions_inds[-1]+1:]
 
     @classmethod
-    def type_combos(self):
-        # p1, p2 must have distinct cards, and nature will reveal the remaining cards in some order
-        combos = []
-        # get all permutations of n cards
-        perms = list(permutations(range(self.n)))
-        for p in perms:
-            combos.append((p[0], p[1], "".join([str(x) for x in p[2:]])))
-        return combos
+    def random(cls, rng=None):
+        """
+        Return a game state with a random deal. Nature's type is the order in which the remaining cards are revealed.
+        The deal is sampled directly, so the n! orderings are never built.
+        """
+        rng = np.random if rng is None else rng
+        p = rng.permutation(cls.n)
+        return cls(p1_type=int(p[0]), p2_type=int(p[1]), nature_type="".join([str(x) for x in p[2:]]), history="")
+
+    # the specialized Kuhn best response assumes a single betting round, so use the generic tree walk
+    best_response = classmethod(ZeroSumGame.best_response.__func__)
+
+    # type_combos is inherited from Kuhn: the n(n-1) deals of the players' cards, with nature_type None.
+    # nature then reveals the cards lazily, see chance_outcomes.
     
+    # betting_round_histories = ["KK", "KBC", "BC"]
+    BETTING_ROUND_HISTORIES = ("K", "BC")  # complete betting rounds which lead to a reveal
+    # partial_betting_round_histories = ["K", "B"] for player 1
+    PARTIAL_BETTING_ROUND_HISTORIES = ("", "B")  # the partial betting round at each player's info sets
+
+    @staticmethod
+    def count_info_sets(n):
+        """
+        Return the number of info sets of either player in the n card game, without enumerating them.
+        For each hand and each number of reveals k (at most n-3), there are 2^k choices of complete betting rounds
+        and (n-1)!/(n-1-k)! ordered choices of revealed cards.
+        """
+        return n * sum(2**k * math.perm(n - 1, k) for k in range(n - 2))
+
     @classmethod
-    def all_info_sets(cls, player):
-        # betting_round_histories = ["KK", "KBC", "BC"]
-        betting_round_histories = ["K", "BC"]
-        if player == 0:
-            partial_betting_round_histories = [""]
-        if player == 1:
-            partial_betting_round_histories = ["B"]
-            # partial_betting_round_histories = ["K", "B"]
-
-        info_sets = []
+    def iter_info_sets(cls, player):
+        """
+        Yield the info sets of player in canonical order: by hand, then number of reveals, then
+        (first betting round, first reveal, second betting round, ...) in lexicographic order.
+        The position of an info set in this order is info_set_index(info_set).
+        """
+        partial = cls.PARTIAL_BETTING_ROUND_HISTORIES[player]
         for hand in range(cls.n):
-            # there can be at most n-3 reveals.
-            # each can have a full betting round before
-            # then a partial betting round at the end
-            for num_reveals in range(cls.n-2):
-                # interleave possible betting round histories with the reveals
-                # this gives the history up until the final partial betting round
-                possible_reveals = [str(x) for x in range(cls.n) if x != hand]
-                interleavings = utils.generate_interleavings(betting_round_histories, True, num_reveals, possible_reveals, False, num_reveals)
-
-                # now find combinations of interleavings with partial betting round histories at the end.
-                full_histories = utils.generate_interleavings(interleavings, False, 1, partial_betting_round_histories, False, 1)
-                for history in full_histories:
-                    info_sets.append(InfoSet(hand, history))
-        return info_sets
-    
+            possible_reveals = [x for x in range(cls.n) if x != hand]
+            for num_reveals in range(cls.n - 2):
+                # digits alternate between a betting round choice and the index of a card not yet revealed
+                radices = []
+                for j in range(num_reveals):
+                    radices += [len(cls.BETTING_ROUND_HISTORIES), len(possible_reveals) - j]
+                for digits in product(*[range(r) for r in radices]):
+                    remaining = possible_reveals.copy()
+                    history = ""
+                    for j in range(num_reveals):
+                        history += cls.BETTING_ROUND_HISTORIES[digits[2 * j]]
+                        history += str(remaining.pop(digits[2 * j + 1]))
+                    yield InfoSet(hand, history + partial)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def all_info_sets(cls, player):
+        """ Return the info sets of player, in the canonical order of iter_info_sets. Computed once per class. """
+        return tuple(cls.iter_info_sets(player))
+
+    @classmethod
+    def info_set_index(cls, info_set):
+        """
+        Return the position of info_set in all_info_sets (for either player), computed directly from the history.
+        """
+        n = cls.n
+        hand = info_set.type
+        history = info_set.history
+        # parse the history into complete betting rounds and reveals
+        rounds, reveals = [], []
+        i = 0
+        while i < len(history) and (history[i:].startswith("K") or history[i:].startswith("BC")):
+            rounds.append(cls.BETTING_ROUND_HISTORIES.index("K" if history[i] == "K" else "BC"))
+            i += len(cls.BETTING_ROUND_HISTORIES[rounds[-1]])
+            if i >= len(history) or not history[i].isnumeric():
+                raise ValueError(f"Invalid info set: {info_set}")
+            reveals.append(int(history[i]))
+            i += 1
+        if history[i:] not in cls.PARTIAL_BETTING_ROUND_HISTORIES:
+            raise ValueError(f"Invalid info set: {info_set}")
+        num_reveals = len(reveals)
+
+        index = hand * (cls.count_info_sets(n) // n)
+        index += sum(2**k * math.perm(n - 1, k) for k in range(num_reveals))
+        remaining = [x for x in range(n) if x != hand]
+        offset = 0
+        for j in range(num_reveals):
+            offset = offset * len(cls.BETTING_ROUND_HISTORIES) + rounds[j]
+            offset = offset * len(remaining) + remaining.index(reveals[j])
+            remaining.remove(reveals[j])
+        return index + offset
+
     @classmethod
     def get_actions_at_info_set(cls, info_set):
         # find last nature action (numbers)
         hist = cls.hist_since_nature_action(info_set.history)
-        if hist == "":
+        if hist not in cls.PARTIAL_BETTING_ROUND_HISTORIES:
+            raise ValueError(f"Invalid info set: {info_set}")
+        return cls.round_actions(hist)
+
+    @staticmethod
+    def round_actions(round_history):
+        """ Return the actions available to the player to act after round_history, the history of the current betting round. """
+        if round_history == "":
             return ["K", "B"]
 
-        if hist in ["B"]:
+        if round_history in ["B"]:
             return ["F", "C"]
-        raise ValueError(f"Invalid info set: {info_set}")
+        raise ValueError(f"Invalid betting round history: {round_history!r}")
+
+    def get_actions(self):
+        """ Like ZeroSumGame.get_actions, but reads the tracked round history instead of parsing the info set's history. """
+        if self.is_terminal():
+            return []
+        if self.current_player() == 2:
+            return [action for action, _ in self.chance_outcomes()]
+        return self.round_actions(self._round_history)
 
     def get_nature_action(self):
         '''
         reveal a card from the deck. Nature's type dictates the order in which to reveal cards
         '''
-        past_nature_actions = len([i for i, c in enumerate(self.history) if c.isnumeric()])
-        return str(self.nature_type[past_nature_actions])
+        return str(self.nature_type[self._num_reveals])
+
+    def chance_outcomes(self):
+        '''
+        If nature's type fixes the reveal order, the next card in it. 
+        Otherwise (nature_type is None) each card still unrevealed, with equal probability.
+        '''
+        if self.nature_type is not None:
+            return [(self.get_nature_action(), 1.0)]
+        revealed = {int(c) for c in self.history if c.isnumeric()}
+        unrevealed = [str(x) for x in range(self.n) if x not in revealed and x != self.p1_type and x != self.p2_type]
+        return [(card, 1 / len(unrevealed)) for card in unrevealed]
 
     def current_player(self) -> int:
         """Return the index of the current player, or 2 for nature. May return anything if the game is over."""
-        # find last nature action (numbers)
-        hist = self.hist_since_nature_action(self.history)
+        hist = self._round_history
 
         if hist in ["", "KB"]:
             return 0
@@ -97,8 +212,23 @@ class ProgressiveKuhn(Kuhn, ABC):
             if self.history[-1] == "F":
                 return True # folded
         # play ends when nature has one card unrevealed and the betting round is over
-        past_nature_actions = len([i for i, c in enumerate(self.history) if c.isnumeric()])
-        total_unrevealed = len(self.nature_type) - past_nature_actions
+        total_unrevealed = self.n - 2 - self._num_reveals
         return total_unrevealed == 1 and self.current_player() == 2
 
+    # the betting table of Kuhn covers a single betting round, so the pot and payoffs are computed from the whole history
+
+    def get_pot(self):
+        """ Return the current pot size, including the ante """
+        # for each call (and implicit bet), the pot increases by 2
+        # pot starts at 2
+        return 2 + 2 * self.history.count("C")
+
+    def _do_get_p1_payoff(self):
+        stake = self.get_pot() // 2
+        if self.history[-1] == "F":
+            # the player to act before the fold is the one who folded
+            folder = (len(self._round_history) - 1) % 2
+            return stake if folder == 1 else -stake
+        return stake if self.p1_type > self.p2_type else -stake
+
    
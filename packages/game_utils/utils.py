@@ -4,36 +4,176 @@ from game_utils.InfoSet import InfoSet
 # import pandas as pd
 from game_utils.Strategy import MixedStrategy
 from itertools import permutations
+from collections.abc import Mapping
 
 
-def integrate(func, a, b, n=1000):
-    """Numerical integration using the trapezoidal rule."""
-    x = np.linspace(a, b, n)
-    y = np.fromiter((func(i) for i in x), dtype=np.float64, count=n)
-    return np.trapezoid(y, x=x)
+INTEGRATION_METHODS = ("trapezoid", "gauss", "adaptive")
+_DEFAULT_NODES = {"trapezoid": 1000, "gauss": 20}
 
-def double_integral(f_xy, x_min_of_y, x_max_of_y, y_min, y_max, grid_size=1001):
-    # Integrate f(x,y) over the region defined by x_min_of_y, x_max_of_y, y_min, y_max
-    return integrate(
-        lambda y: integrate(f_xy, x_min_of_y(y), x_max_of_y(y), n=grid_size),
-        y_min, y_max, n=grid_size
-    )
+# Gauss-Kronrod 7-15 rule on [-1, 1] (QUADPACK qk15). Kronrod nodes from the outside in, then the center.
+_KRONROD_NODES = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.000000000000000000000000000000000,
+])
+_KRONROD_WEIGHTS = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+])
+# the 7 point Gauss rule uses every other Kronrod node
+_GAUSS7_WEIGHTS = np.array([
+    0, 0.129484966168869693270611432679082, 0, 0.279705391489276667901467771423780,
+    0, 0.381830050505118944950369775488975, 0, 0.417959183673469387755102040816327,
+])
+_GK15_NODES = np.concatenate([-_KRONROD_NODES[:-1], _KRONROD_NODES[::-1]])
+_GK15_KRONROD_WEIGHTS = np.concatenate([_KRONROD_WEIGHTS[:-1], _KRONROD_WEIGHTS[::-1]])
+_GK15_GAUSS_WEIGHTS = np.concatenate([_GAUSS7_WEIGHTS[:-1], _GAUSS7_WEIGHTS[::-1]])
 
-def compute_area(x_min_of_y, x_max_of_y, y_min, y_max, grid_size=1001):
+
+def _evaluate(func, x, vectorized):
+    """ Evaluate func at every point of the array x. A vectorized func is called once on the whole array
+    (and may return a scalar for a constant integrand), otherwise it is called once per point. """
+    if vectorized:
+        return np.broadcast_to(np.asarray(func(x), dtype=np.float64), x.shape)
+    return np.fromiter((func(i) for i in x.ravel()), dtype=np.float64, count=x.size).reshape(x.shape)
+
+def _pieces(a, b, breakpoints):
+    """
+    Split [a, b] at the breakpoints that lie inside it. a and b may be arrays (of the same shape).
+    Returns the list of (lo, hi) pieces, all oriented from min(a, b) to max(a, b), and the sign of the orientation.
+    Breakpoints outside [a, b] give pieces of length 0.
+    """
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    sign = np.where(b >= a, 1.0, -1.0)
+    knots = [lo] + [np.clip(bp, lo, hi) for bp in sorted(breakpoints or [])] + [hi]
+    return list(zip(knots[:-1], knots[1:])), sign
+
+def _trapezoid(func, lo, hi, n, vectorized):
+    # an odd number of points, so the coarse rule on every other point also ends at hi
+    n += 1 - n % 2
+    t = np.linspace(0, 1, n)
+    x = lo[..., None] + (hi - lo)[..., None] * t
+    y = _evaluate(func, x, vectorized)
+    value = np.trapezoid(y, x=x, axis=-1)
+    # the same rule on every other point, to estimate the error
+    coarse = np.trapezoid(y[..., ::2], x=x[..., ::2], axis=-1)
+    return value, np.abs(value - coarse) / 3
+
+def _gauss(func, lo, hi, n, vectorized, full_output):
+    nodes, weights = np.polynomial.legendre.leggauss(n)
+    half, mid = (hi - lo) / 2, (hi + lo) / 2
+    y = _evaluate(func, mid[..., None] + half[..., None] * nodes, vectorized)
+    value = half * (y @ weights)
+    if not full_output:
+        return value, np.zeros_like(value)
+    # the rule with half as many nodes, to estimate the error
+    nodes, weights = np.polynomial.legendre.leggauss(max(1, n // 2))
+    coarse = half * (_evaluate(func, mid[..., None] + half[..., None] * nodes, vectorized) @ weights)
+    return value, np.abs(value - coarse)
+
+def _adaptive(func, lo, hi, vectorized, tol, max_subdivisions=50, max_intervals=2**14):
+    """
+    Adaptive Gauss-Kronrod (7-15) quadrature over [lo, hi] (scalars).
+    Every sweep evaluates all the intervals that are not yet accurate enough at once, and bisects them.
+    An interval is accepted once its error estimate |K15 - G7| is below its share of tol.
+    Intervals where func is not finite are accepted as they are (their error is inf), since bisecting cannot fix them.
+    Refinement also stops after max_subdivisions levels, or when the next sweep would take the total number of
+    evaluated intervals past max_intervals.
+    """
+    total_width = hi - lo
+    if total_width == 0:
+        return 0.0, 0.0
+    value, error = 0.0, 0.0
+    los, his = np.array([lo]), np.array([hi])
+    n_intervals = 0
+    for level in range(max_subdivisions + 1):
+        half, mid = (his - los) / 2, (his + los) / 2
+        y = _evaluate(func, mid[:, None] + half[:, None] * _GK15_NODES, vectorized)
+        kronrod, gauss = half * (y @ _GK15_KRONROD_WEIGHTS), half * (y @ _GK15_GAUSS_WEIGHTS)
+        finite = np.isfinite(y).all(axis=1)
+        with np.errstate(invalid="ignore"):
+            interval_errors = np.where(finite, np.abs(kronrod - gauss), np.inf)
+        n_intervals += len(los)
+        last = level == max_subdivisions or n_intervals + 2 * len(los) > max_intervals
+        done = (interval_errors <= tol * (his - los) / total_width) | ~finite | last
+        value += kronrod[done].sum()
+        error += interval_errors[done].sum()
+        los, mids, his = los[~done], mid[~done], his[~done]
+        if len(los) == 0:
+            break
+        los, his = np.concatenate([los, mids]), np.concatenate([mids, his])
+    return value, error
+
+def integrate(func, a, b, n=None, method="trapezoid", vectorized=False, breakpoints=None, tol=1e-10, full_output=False):
+    """
+    Numerically integrate func from a to b.
+    Args:
+        n: the number of points (trapezoid, default 1000, rounded up to odd) or nodes (gauss, default 20) per piece. Unused by adaptive.
+        method:
+            - "trapezoid": the trapezoidal rule on an evenly spaced grid.
+            - "gauss": n point Gauss-Legendre quadrature, exact for polynomials of degree up to 2n-1.
+            - "adaptive": Gauss-Kronrod (7-15) quadrature, bisecting intervals until the error estimate is below tol.
+        vectorized: if True, func is called on whole arrays of points instead of once per point.
+            With trapezoid and gauss, a and b may then also be arrays, and an array of integrals is returned.
+        breakpoints: points where func jumps (or has a kink). The integral is split there, so no rule straddles them.
+        tol: the absolute error target of the adaptive method.
+        full_output: if True, return (integral, error estimate) instead of the integral.
+    """
+    if method not in INTEGRATION_METHODS:
+        raise ValueError(f"Unknown integration method {method}, expected one of {INTEGRATION_METHODS}")
+    pieces, sign = _pieces(a, b, breakpoints)
+    n = n if n is not None else _DEFAULT_NODES.get(method)
+    value, error = 0.0, 0.0
+    for lo, hi in pieces:
+        if method == "trapezoid":
+            piece_value, piece_error = _trapezoid(func, lo, hi, n, vectorized)
+        elif method == "gauss":
+            piece_value, piece_error = _gauss(func, lo, hi, n, vectorized, full_output)
+        else:
+            if np.ndim(lo) > 0:
+                raise ValueError("The adaptive method only supports scalar endpoints")
+            piece_value, piece_error = _adaptive(func, float(lo), float(hi), vectorized, tol / len(pieces))
+        value, error = value + piece_value, error + piece_error
+    value = sign * value
+    if np.ndim(value) == 0:
+        value, error = float(value), float(error)
+    return (value, error) if full_output else value
+
+def double_integral(f_xy, x_min_of_y, x_max_of_y, y_min, y_max, grid_size=1001, method="trapezoid", vectorized=False, breakpoints=None, tol=1e-10):
+    """
+    Integrate f(x,y) over the region defined by x_min_of_y, x_max_of_y, y_min, y_max.
+    With vectorized=True, f_xy and the bounds are called on arrays, and every inner integral is computed in one call.
+    The adaptive method is used for the outer integral over y (with breakpoints), with gauss inner integrals.
+    """
+    inner_method = "gauss" if method == "adaptive" else method
+    inner_n = None if method == "adaptive" else grid_size
+    if not vectorized:
+        return integrate(
+            lambda y: integrate(lambda x: f_xy(x, y), x_min_of_y(y), x_max_of_y(y), n=inner_n, method=inner_method),
+            y_min, y_max, n=grid_size, method=method, breakpoints=breakpoints, tol=tol
+        )
+    def inner(y):
+        x_min = np.broadcast_to(x_min_of_y(y), np.shape(y))
+        x_max = np.broadcast_to(x_max_of_y(y), np.shape(y))
+        return integrate(lambda x: f_xy(x, y[..., None]), x_min, x_max, n=inner_n, method=inner_method, vectorized=True)
+    return integrate(inner, y_min, y_max, n=grid_size, method=method, vectorized=True, breakpoints=breakpoints, tol=tol)
+
+def compute_area(x_min_of_y, x_max_of_y, y_min, y_max, grid_size=1001, method="trapezoid", vectorized=False, breakpoints=None, tol=1e-10):
     # Compute the area of the region defined by x_min_of_y, x_max_of_y, y_min, y_max
-    return integrate(
-        lambda y: integrate(lambda x: 1, x_min_of_y(y), x_max_of_y(y), n=grid_size),
-        y_min, y_max, n=grid_size
-    )
+    # the inner integral of 1 over x is just the width of the region at height y
+    width = lambda y: x_max_of_y(y) - x_min_of_y(y)
+    return integrate(width, y_min, y_max, n=grid_size, method=method, vectorized=vectorized, breakpoints=breakpoints, tol=tol)
 
-def compute_area_vert(x_min, x_max, y_min_of_x, y_max_of_x, grid_size=1001):
+def compute_area_vert(x_min, x_max, y_min_of_x, y_max_of_x, grid_size=1001, method="trapezoid", vectorized=False, breakpoints=None, tol=1e-10):
     # Compute the area of the region defined by x_min, x_max, y_min_of_x, y_max_of_x
-    return integrate(
-        lambda x: integrate(lambda y: 1, y_min_of_x(x), y_max_of_x(x), n=grid_size),
-        x_min, x_max, n=grid_size
-    )
+    height = lambda x: y_max_of_x(x) - y_min_of_x(x)
+    return integrate(height, x_min, x_max, n=grid_size, method=method, vectorized=vectorized, breakpoints=breakpoints, tol=tol)
 
-def inverse_integration(f, a, b, n=1000):
+def inverse_integration(f, a, b, n=None, method="trapezoid", vectorized=False):
     """
     INVERSE FUNCTION TRICK
 
@@ -43,11 +183,9 @@ def inverse_integration(f, a, b, n=1000):
     by instead computing 
     -integrate(f, a, b) + bf(b) - af(a)
     where f_inv is the inverse function of f.
+    With vectorized=True, a and b may be arrays.
     """
-    if b > a:
-        return -integrate(f, a, b) + b * f(b) - a * f(a)
-    else:
-        return integrate(f, b, a) + b * f(b) - a * f(a)
+    return -integrate(f, a, b, n=n, method=method, vectorized=vectorized) + b * f(b) - a * f(a)
     
 
 def cond_print(s, cond):
@@ -59,7 +197,7 @@ def multiline_print(s):
     s is any iterable. split the iterable by \n and print each element.
     '''
     
-    if isinstance(s, dict):
+    if isinstance(s, Mapping):
         for k, i in s.items():
             print(f"{k} : {i}")
         return
@@ -75,32 +213,52 @@ def normalize(vector):
 def if_not_none(var, if_none):
     return var if var is not None else if_none
 
-def generate_interleavings(list_a, replace_a, max_from_a, list_b, replace_b, max_from_b):
+def iter_interleavings(list_a, replace_a, max_from_a, list_b, replace_b, max_from_b):
     """
-    make a list of all strings that can be generated by interleaving elements from the lists
+    yield all strings that can be generated by interleaving elements from the lists
     a, b, a, etc. the elements need not come from the lists in order, but must alternate a and b.
     if replace_a: allow repeated use of elements of a
     if replace_b: allow repeated use of elements of b
     max_from_a: maximum number of elements from a to use
     max_from_b: maximum number of elements from b to use
+    The strings are yielded lazily, in depth first order of the choices (each list in its given order),
+    so only the current prefix is kept in memory.
     """
-    all_strs = []
-    def helper(prefix, a_remaining, max_a_remaining, b_remaining, max_b_remaining):
-        # always start with a
-        if max_a_remaining == 0 or len(a_remaining)==0:
-            all_strs.append(prefix)
+    def helper(prefix, a_remaining, replace_a, max_a_remaining, b_remaining, replace_b, max_b_remaining):
+        # always start with a, then swap the roles of a and b
+        if max_a_remaining == 0 or len(a_remaining) == 0:
+            yield prefix
             return
 
-        for choice in a_remaining:
-            if replace_a: # leave choice in the list
-                helper(prefix+choice, b_remaining, max_b_remaining, a_remaining, max_a_remaining-1)
-            else: # remove choice from the list
-                new_a_remaining = a_remaining.copy()
-                new_a_remaining.remove(choice)
-                helper(prefix+choice, b_remaining, max_b_remaining, new_a_remaining, max_a_remaining-1)
-        return
-    helper("", list_a, max_from_a, list_b, max_from_b)
-    return all_strs
+        for i, choice in enumerate(a_remaining):
+            # leave choice in the list if replace_a, otherwise remove it
+            new_a_remaining = a_remaining if replace_a else a_remaining[:i] + a_remaining[i+1:]
+            yield from helper(prefix+choice, b_remaining, replace_b, max_b_remaining, new_a_remaining, replace_a, max_a_remaining-1)
+    yield from helper("", tuple(list_a), replace_a, max_from_a, tuple(list_b), replace_b, max_from_b)
+
+def count_interleavings(list_a, replace_a, max_from_a, list_b, replace_b, max_from_b):
+    """
+    Return the number of strings iter_interleavings yields for these arguments (counting repeats), without enumerating them.
+    Every choice from a list leaves the same number of choices for the next pick, so the interleavings all have the same length,
+    and their number is the product of the number of choices at each pick.
+    """
+    count = 1
+    sizes, replace, max_from, used = [len(list_a), len(list_b)], [replace_a, replace_b], [max_from_a, max_from_b], [0, 0]
+    turn = 0
+    while True:
+        choices = sizes[turn] if replace[turn] else sizes[turn] - used[turn]
+        if used[turn] == max_from[turn] or choices <= 0:
+            return count
+        count *= choices
+        used[turn] += 1
+        turn = 1 - turn
+
+def generate_interleavings(list_a, replace_a, max_from_a, list_b, replace_b, max_from_b):
+    """
+    make a list of all strings that can be generated by interleaving elements from the lists
+    a, b, a, etc. See iter_interleavings, which yields the same strings lazily.
+    """
+    return list(iter_interleavings(list_a, replace_a, max_from_a, list_b, replace_b, max_from_b))
 
 def interleave_strings(list_a, list_b):
     interleaved = []
@@ -151,6 +309,48 @@ def heatmap(data, x_label=None, x_ticks=None, y_label=None, y_ticks=None, z_tick
         plt.title(title)
     plt.show()
 
+def _sorted_labels(labels):
+    """ The distinct labels, sorted if they can be compared, otherwise in order of first appearance. """
+    distinct = list(dict.fromkeys(labels))
+    try:
+        return sorted(distinct)
+    except TypeError:
+        return distinct
+
+def strategy_matrix(strategy, action=1, fill=0.0):
+    '''
+    strategy: a MixedStrategy, or any mapping from InfoSets to arrays of action frequencies.
+    action: the index of the action whose frequency fills the matrix.
+    fill: the value for (type, history) pairs with no info set, or where action is not available.
+    return:
+        a 2D numpy array where the rows are the types of the player and the columns are the histories.
+        a list of the distinct types of the player (rows), sorted when the types can be compared
+        a list of the distinct histories (columns), sorted by their reversed string
+    The matrix is filled in one pass over the info sets. For a MixedStrategy, the frequencies are read
+    straight from its frequency matrix. The result is a C-contiguous float64 array, so
+    pd.DataFrame(arr, index=types, columns=histories, copy=False) wraps it without copying.
+    '''
+    if isinstance(strategy, MixedStrategy):
+        info_sets = strategy.index.info_sets
+        available = strategy.index.num_actions > action
+        values = strategy.frequencies[:, action] if action < strategy.index.max_actions else np.full(len(info_sets), fill)
+    else:
+        info_sets = list(strategy.keys())
+        freqs = [strategy[I] for I in info_sets]
+        available = np.fromiter((len(f) > action for f in freqs), dtype=bool, count=len(freqs))
+        values = np.fromiter((f[action] if len(f) > action else fill for f in freqs), dtype=np.float64, count=len(freqs))
+
+    types_distinct = _sorted_labels(I.type for I in info_sets)
+    histories_distinct = sorted(set(I.history for I in info_sets), key=lambda x: x[::-1])
+    type_rows = {t: i for i, t in enumerate(types_distinct)}
+    history_cols = {h: j for j, h in enumerate(histories_distinct)}
+    rows = np.fromiter((type_rows[I.type] for I in info_sets), dtype=int, count=len(info_sets))
+    cols = np.fromiter((history_cols[I.history] for I in info_sets), dtype=int, count=len(info_sets))
+
+    strategy_arr = np.full((len(types_distinct), len(histories_distinct)), fill, dtype=np.float64)
+    strategy_arr[rows[available], cols[available]] = values[available]
+    return strategy_arr, types_distinct, histories_distinct
+
 def binaryStrategyArr(strategy):
     '''
     strategy: dict which maps InfoSets to lists of exactly 2 probabilities.
@@ -160,21 +360,9 @@ def binaryStrategyArr(strategy):
         a 2D numpy array where the rows are the types of the player and the columns are the histories.
         a list of the distinct types of the player (rows)
         a list of the distinct histories (columns)
+    The entries are the frequencies of the second (aggressive) action, see strategy_matrix.
     '''
-    types_distinct = sorted(list({infoSet.type for infoSet in strategy.keys()}))
-    n = len(types_distinct)
-    histories_distinct = sorted(list({infoSet.history for infoSet in strategy.keys()}), key=lambda x: x[::-1])
-    m = len(histories_distinct)
-    strategy_arr = np.zeros((n, m))
-
-    for i, history in enumerate(histories_distinct):
-        for type in range(n):
-            infoSet = InfoSet(type, history)
-            if infoSet in strategy:
-                freqs = strategy[infoSet]
-                aggressive_freq = freqs[1]
-                strategy_arr[type, i] = aggressive_freq
-    return strategy_arr, types_distinct, histories_distinct
+    return strategy_matrix(strategy, action=1)
 
 def binaryStrategyHeatmap(strategy, figsize=(10, 5), transpose=False, title=None):
     '''
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# game_utils lives in packages/ and is not installed as a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "packages"))
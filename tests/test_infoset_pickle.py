@@ -0,0 +1,35 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from game_utils.InfoSet import InfoSet
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.mark.parametrize("protocol", [0, 4])
+def test_load_baseline_pickle(protocol):
+    # a {InfoSet: frequencies} dict pickled when InfoSet was a frozen dataclass, with
+    # dict(MixedStrategy.from_normal_form(uniform, 0, Kuhn.nCard(3))) at the baseline commit
+    with open(os.path.join(DATA_DIR, f"infoset_baseline_protocol{protocol}.pkl"), "rb") as f:
+        strategy = pickle.load(f)
+
+    assert len(strategy) == 6
+    for card in range(3):
+        for history in ("", "KB"):
+            info_set = InfoSet(card, history)
+            assert info_set in strategy
+            np.testing.assert_array_equal(strategy[info_set], [0.5, 0.5])
+
+    for info_set in strategy:
+        canonical = InfoSet(info_set.type, info_set.history)
+        assert info_set == canonical
+        assert hash(info_set) == hash(canonical)
+        assert info_set.id == canonical.id
+
+
+def test_pickle_round_trip_is_canonical():
+    info_set = InfoSet(1, "KB")
+    assert pickle.loads(pickle.dumps(info_set)) is info_set